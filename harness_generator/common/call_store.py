@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Tuple
+from common.utils import iter_json_array
+
+#
+# Indexed SQLite store for the call site databases. call-database.json and
+# generator-database.json are ingested once, one call site at a time, and are
+# only re-ingested when the json file changes. The analysis then pulls the
+# per function statistics and the call sites it actually keeps out of the
+# store instead of holding every call site in memory.
+#
+# Only the grouping in load_data/sort_data runs against the store. The call
+# sites it keeps and every generator are still built in memory, and
+# collect_known_constants and get_generators scan those, so memory is not
+# bounded in those passes. They can't be answered from the store because
+# load_data rewrites the argument types from the function template.
+#
+class CallSiteStore:
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        # Several loaders may ingest into the same store, so wait on the lock
+        # of the other connection rather than failing straight away
+        self.connection = sqlite3.connect(db_file, timeout=600)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                path TEXT,
+                size INTEGER,
+                mtime_ns INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS call_sites (
+                id INTEGER PRIMARY KEY,
+                source TEXT,
+                function TEXT,
+                service TEXT,
+                arg_count INTEGER,
+                raw TEXT
+            );
+            CREATE INDEX IF NOT EXISTS call_sites_function ON call_sites (source, function, arg_count);
+            CREATE INDEX IF NOT EXISTS call_sites_service ON call_sites (source, service);
+            -- Stores written before the call sites were the only thing looked up
+            -- still carry a per argument table nothing reads
+            DROP TABLE IF EXISTS arguments;
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    #
+    # (Re)load json_file under the name source unless the stored copy is still current
+    #
+    def ingest(self, source: str, json_file: str, batch_size: int = 10000) -> None:
+        path = os.path.abspath(json_file)
+        stat = os.stat(path)
+        known = self.connection.execute('SELECT path, size, mtime_ns FROM sources WHERE source = ?', (source,)).fetchone()
+        if known == (path, stat.st_size, stat.st_mtime_ns):
+            return
+
+        print(f'INFO: Ingesting {json_file} into {self.db_file}')
+        with self.connection:
+            self.connection.execute('DELETE FROM call_sites WHERE source = ?', (source,))
+            self.connection.execute('DELETE FROM sources WHERE source = ?', (source,))
+            next_id = self.connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM call_sites').fetchone()[0]
+            sites = []
+            for raw_function_block in iter_json_array(json_file):
+                sites.append((next_id, source, raw_function_block.get('Function'), raw_function_block.get('Service'),
+                              len(raw_function_block.get('Arguments', {})), json.dumps(raw_function_block, separators=(',', ':'))))
+                next_id += 1
+                if len(sites) >= batch_size:
+                    self._insert(sites)
+                    sites = []
+            self._insert(sites)
+            # Only mark the source as current once everything made it in
+            self.connection.execute('INSERT INTO sources VALUES (?, ?, ?, ?)', (source, path, stat.st_size, stat.st_mtime_ns))
+
+    def _insert(self, sites: List[Tuple]) -> None:
+        self.connection.executemany('INSERT INTO call_sites VALUES (?, ?, ?, ?, ?, ?)', sites)
+
+    #
+    # For every function, in the order the functions were first seen, map each
+    # parameter count to the number of call sites with that count and the
+    # services those call sites were made through
+    #
+    def group_stats(self, source: str) -> Dict[str, Dict[int, Tuple[int, List[str]]]]:
+        group_stats = {}
+        rows = self.connection.execute('''
+            SELECT function, arg_count, COUNT(*), MIN(id) FROM call_sites
+            WHERE source = ? GROUP BY function, arg_count ORDER BY MIN(id)''', (source,))
+        for function, arg_count, count, _ in rows:
+            group_stats.setdefault(function, {})[arg_count] = (count, [])
+        rows = self.connection.execute('''
+            SELECT function, arg_count, service, MIN(id) FROM call_sites
+            WHERE source = ? GROUP BY function, arg_count, service ORDER BY MIN(id)''', (source,))
+        for function, arg_count, service, _ in rows:
+            group_stats[function][arg_count][1].append(service)
+        return group_stats
+
+    #
+    # Yields the raw json call sites of source in their original order,
+    # optionally only those of one function with a given parameter count
+    #
+    def iter_call_sites(self, source: str, function: str = None, arg_count: int = None) -> Iterator[dict]:
+        if arg_count is None:
+            rows = self.connection.execute('SELECT raw FROM call_sites WHERE source = ? ORDER BY id', (source,))
+        else:
+            rows = self.connection.execute('''
+                SELECT raw FROM call_sites WHERE source = ? AND function IS ? AND arg_count = ?
+                ORDER BY id''', (source, function, arg_count))
+        for (raw,) in rows:
+            yield json.loads(raw)
+
@@ -0,0 +1,146 @@
+from array import array
+from typing import Callable, Dict, Iterable, List, Tuple
+from common.types import FunctionBlock
+
+# NumPy is optional, without it the kernels below run as plain Python loops
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#
+# Columnar view of a set of call sites for the frequency analysis. Strings are
+# coded as integers into a shared name table and every column is a typed array,
+# so counting and filtering run over flat integer arrays (vectorized when NumPy
+# is available) instead of walking the FunctionBlock objects.
+#
+# Site columns hold one row per call site, argument columns one row per
+# argument value (every entry of every argument list of every call site).
+#
+class CallSiteTable:
+    site_columns = ('function', 'service', 'arg_count')
+    argument_columns = ('site', 'arg_type', 'data_type', 'arg_dir', 'variable', 'last')
+    # Columns that hold plain integers rather than coded strings
+    integer_columns = ('arg_count', 'site', 'last')
+
+    def __init__(self):
+        self.names = []
+        self.codes = {}
+        self.columns = {column: array('q') for column in self.site_columns + self.argument_columns}
+
+    @classmethod
+    def from_data(cls, input_data: Dict[str, Iterable[FunctionBlock]]) -> 'CallSiteTable':
+        table = cls()
+        for function, function_blocks in input_data.items():
+            for function_block in function_blocks:
+                table.add(function_block, function)
+        return table
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.names)
+            self.names.append(value)
+        return code
+
+    def add(self, function_block: FunctionBlock, function: str = None) -> None:
+        columns = self.columns
+        site = len(columns['function'])
+        columns['function'].append(self.code(function_block.function if function is None else function))
+        columns['service'].append(self.code(function_block.service))
+        columns['arg_count'].append(len(function_block.arguments))
+        for argument in function_block.arguments.values():
+            for index, arg in enumerate(argument):
+                columns['site'].append(site)
+                columns['arg_type'].append(self.code(arg.arg_type))
+                columns['data_type'].append(self.code(arg.data_type))
+                columns['arg_dir'].append(self.code(arg.arg_dir))
+                columns['variable'].append(self.code(arg.variable))
+                columns['last'].append(index == len(argument) - 1)
+
+    def __len__(self) -> int:
+        return len(self.columns['function'])
+
+    def column(self, name: str):
+        if np is not None:
+            return np.frombuffer(self.columns[name], dtype=np.int64)
+        return self.columns[name]
+
+    def decode(self, name: str, value: int):
+        return value if name in self.integer_columns else self.names[value]
+
+    #
+    # Number of rows for every distinct combination of the given columns, in the
+    # order the combinations first appear
+    #
+    def group_counts(self, *names: str) -> Dict[Tuple, int]:
+        if len(self.columns[names[0]]) == 0:
+            return {}
+        if np is not None:
+            keys = np.stack([self.column(name) for name in names], axis=1)
+            unique, first, counts = np.unique(keys, axis=0, return_index=True, return_counts=True)
+            order = np.argsort(first, kind='stable')
+            rows = zip(unique[order].tolist(), counts[order].tolist())
+        else:
+            counts = {}
+            for key in zip(*(self.columns[name] for name in names)):
+                counts[key] = counts.get(key, 0) + 1
+            rows = counts.items()
+        return {
+            tuple(self.decode(name, value) for name, value in zip(names, key)): count
+            for key, count in rows
+        }
+
+    #
+    # Evaluate predicate once per distinct string of a coded column and spread
+    # the answers over its rows
+    #
+    def mask(self, name: str, predicate: Callable[[str], bool]):
+        if np is not None:
+            codes, inverse = np.unique(self.column(name), return_inverse=True)
+            lookup = np.array([bool(predicate(self.names[code])) for code in codes.tolist()], dtype=bool)
+            return lookup[inverse]
+        lookup = {}
+        for code in self.columns[name]:
+            if code not in lookup:
+                lookup[code] = bool(predicate(self.names[code]))
+        return [lookup[code] for code in self.columns[name]]
+
+    def integer_mask(self, name: str):
+        if np is not None:
+            return self.column(name).astype(bool)
+        return [bool(value) for value in self.columns[name]]
+
+    #
+    # Elementwise and/or/not over masks plus counting and selecting with them
+    #
+    @staticmethod
+    def both(left, right):
+        if np is not None:
+            return left & right
+        return [a and b for a, b in zip(left, right)]
+
+    @staticmethod
+    def either(left, right):
+        if np is not None:
+            return left | right
+        return [a or b for a, b in zip(left, right)]
+
+    @staticmethod
+    def negate(mask):
+        if np is not None:
+            return ~mask
+        return [not value for value in mask]
+
+    @staticmethod
+    def count(mask) -> int:
+        if np is not None:
+            return int(np.count_nonzero(mask))
+        return sum(mask)
+
+    def distinct(self, name: str, mask) -> List[str]:
+        if np is not None:
+            codes = np.unique(self.column(name)[mask]).tolist()
+        else:
+            codes = sorted({code for code, keep in zip(self.columns[name], mask) if keep})
+        return [self.decode(name, code) for code in codes]
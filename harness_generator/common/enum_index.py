@@ -0,0 +1,70 @@
+from typing import Dict, Optional, Tuple
+from common.types import EnumDef
+from common.indexed import derived_index
+
+#
+# Inverted index over enums.json for matching __ENUM_ARG__ arguments to their
+# enum. An enum matches when the argument type is part of its name, or when one
+# of its values is part of the assignment (case-folded) or of the lower-cased
+# usage (as written), and the first matching enum in file order wins. The
+# values sit in a prefix tree holding the first enum that owns them, so
+# matching walks the assignment and usage once instead of every enum value.
+#
+class EnumIndex:
+    def __init__(self, enums: Dict[str, EnumDef]):
+        self.enums = list(enums.items())
+        self.names = [enum_name.lower() for enum_name, _ in self.enums]
+        self.by_type: Dict[str, Optional[int]] = {}
+        # Every node is [children, first enum with a value ending here,
+        # first enum with an all lower case value ending here]
+        self.values = [{}, None, None]
+        self.max_value = 0
+        for position, (_, enum_def) in enumerate(self.enums):
+            for value in enum_def.values:
+                self.add_value(value, position)
+
+    def add_value(self, value: str, position: int) -> None:
+        node = self.values
+        for char in value.lower():
+            node = node[0].setdefault(char, [{}, None, None])
+        if node[1] is None:
+            node[1] = position
+        if value == value.lower() and node[2] is None:
+            node[2] = position
+        self.max_value = max(self.max_value, len(value))
+
+    #
+    # First enum with a value inside text, field 1 for any value (text is
+    # case-folded) and 2 for values that are all lower case already
+    #
+    def first_value_in(self, text: str, field: int) -> Optional[int]:
+        # an empty value is part of everything
+        first = self.values[field]
+        for start in range(len(text)):
+            node = self.values
+            for char in text[start:start + self.max_value]:
+                node = node[0].get(char)
+                if node is None:
+                    break
+                if node[field] is not None and (first is None or node[field] < first):
+                    first = node[field]
+        return first
+
+    def first_name_with(self, arg_type: str) -> Optional[int]:
+        if arg_type not in self.by_type:
+            self.by_type[arg_type] = next((position for position, name in enumerate(self.names) if arg_type in name), None)
+        return self.by_type[arg_type]
+
+    #
+    # (name, EnumDef) of the enum an argument refers to, or None
+    #
+    def find(self, arg_type: str, assignment: str, usage: str) -> Optional[Tuple[str, EnumDef]]:
+        candidates = [self.first_name_with(arg_type.lower()),
+                      self.first_value_in(assignment.lower(), 1),
+                      self.first_value_in(usage.lower(), 2)]
+        candidates = [position for position in candidates if position is not None]
+        return self.enums[min(candidates)] if len(candidates) > 0 else None
+
+# Kept with the enum map until it changes
+def enum_index(enums: Dict[str, EnumDef]) -> EnumIndex:
+    return derived_index(enums, 'enum_index', lambda: EnumIndex(enums))
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+from typing import Any, Dict, Iterable, List, Set
+from common.types import FunctionBlock, Macros, TypeInfo, EnumDef, scalable_params, type_defs, known_contant_variables
+from common.utils import remove_ref_symbols
+from common.type_graph import type_graph
+from common.enum_index import enum_index
+from common.snapshot_cache import source_digest
+
+_identifiers = re.compile(r'[A-Za-z_]\w*')
+
+#
+# Results of the per function analysis from earlier runs, keyed on a digest of
+# everything the analysis of that function reads (see FunctionInputs). Entries
+# that went unused for keep_runs runs are dropped.
+#
+class FunctionCache:
+    def __init__(self, db_file: str, enabled: bool = True, keep_runs: int = 5):
+        self.db_file = db_file
+        self.enabled = enabled
+        self.keep_runs = keep_runs
+        self.reused = 0
+        self.analyzed = 0
+        self.connection = None
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+            self.connection = sqlite3.connect(db_file, timeout=600)
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    function TEXT,
+                    last_run INTEGER,
+                    result BLOB
+                );
+                CREATE TABLE IF NOT EXISTS runs (
+                    run INTEGER PRIMARY KEY
+                );
+            ''')
+            with self.connection:
+                self.connection.execute('INSERT INTO runs VALUES (NULL)')
+                self.run = self.connection.execute('SELECT MAX(run) FROM runs').fetchone()[0]
+        except Exception as e:
+            print(f'WARNING: Disabling the function analysis cache: {e}')
+            self.enabled = False
+            self.connection = None
+
+    def get(self, key: str) -> Any:
+        if not self.enabled:
+            return None
+        row = self.connection.execute('SELECT result FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            result = pickle.loads(row[0])
+        except Exception as e:
+            print(f'WARNING: Ignoring unreadable function cache entry {key}: {e}')
+            return None
+        with self.connection:
+            self.connection.execute('UPDATE results SET last_run = ? WHERE key = ?', (self.run, key))
+        self.reused += 1
+        return result
+
+    def put(self, key: str, function: str, result: Any) -> None:
+        self.analyzed += 1
+        if not self.enabled:
+            return
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                                    (key, function, self.run, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def close(self) -> None:
+        if self.connection is None:
+            return
+        with self.connection:
+            self.connection.execute('DELETE FROM results WHERE last_run <= ?', (self.run - self.keep_runs,))
+            self.connection.execute('DELETE FROM runs WHERE run < ?', (self.run,))
+        self.connection.close()
+        self.connection = None
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return f'INFO: Function analysis cache disabled, analyzed {self.analyzed} functions'
+        return f'INFO: Function analysis cache: {self.reused} functions reused, {self.analyzed} analyzed'
+
+#
+# Digest of what the analysis of one function depends on: the source of the
+# analysis code, its call sites and template, the harness groups it is listed
+# under, the run flags, every alias, macro, type, cast, enum and generator
+# entry its arguments can reach, and the tables every function reads as a
+# whole (the alias names remove_casts strips against and the scalar, typedef
+# and constant lists of common.types). Anything outside of that can change
+# without invalidating the function.
+#
+class FunctionInputs:
+    def __init__(self,
+                 types: Dict[str, TypeInfo],
+                 generators: Dict[str, FunctionBlock],
+                 aliases: Dict[str, str],
+                 macros: Dict[str, Macros],
+                 enums: Dict[str, EnumDef],
+                 casts: Dict[str, List[str]],
+                 flags: Dict[str, Any]):
+        self.types = types
+        self.aliases = aliases
+        self.macros = macros
+        self.enums = enums
+        self.casts = casts
+        self.flags = flags
+        self.graph = type_graph(aliases, types)
+        self.shared = hashlib.sha256(json.dumps([sorted(aliases.keys()), scalable_params, type_defs, known_contant_variables],
+                                                sort_keys=True).encode()).hexdigest()
+        self.reachable_seen: Dict[str, Set[str]] = {}
+        # Generators by the (reference stripped) type of their OUT arguments,
+        # in generator order
+        self.generators_by_out_type: Dict[str, List[str]] = {}
+        self.generators = generators
+        for name, generator_block in generators.items():
+            for argument in generator_block.arguments.values():
+                if argument[0].arg_dir == "OUT":
+                    out_types = self.generators_by_out_type.setdefault(remove_ref_symbols(argument[0].arg_type), [])
+                    if name not in out_types:
+                        out_types.append(name)
+
+    #
+    # Types reachable from a type name through aliases and struct fields
+    #
+    def reachable_types(self, root: str) -> Set[str]:
+        reachable = self.reachable_seen.get(root)
+        if reachable is None:
+            reachable = set()
+            pending = [root]
+            while pending:
+                type = pending.pop()
+                if type in reachable:
+                    continue
+                reachable.add(type)
+                pending.extend(self.graph.members(type))
+            self.reachable_seen[root] = reachable
+        return reachable
+
+    #
+    # Alias and macro hops get_underlying_type takes from name
+    #
+    def resolution_chain(self, name: str) -> List[str]:
+        chain = []
+        current = remove_ref_symbols(name)
+        while current not in chain and (current in self.aliases.keys() or current in self.macros.keys()):
+            chain.append(current)
+            value = self.aliases[current] if current in self.aliases.keys() else self.macros[current].value
+            current = remove_ref_symbols(value)
+        return chain
+
+    def describe_type(self, type: str) -> Any:
+        type_info = self.types.get(type) if type in self.types.keys() else None
+        fields = None
+        if isinstance(type_info, TypeInfo):
+            fields = [type_info.file] + [[field_info.name, field_info.type] for field_info in type_info.fields]
+        return [type, self.aliases.get(type), fields]
+
+    def describe_macro(self, name: str) -> Any:
+        macro = self.macros.get(name)
+        return [name, None if macro is None else [macro.file, macro.name, macro.value]]
+
+    def digest(self,
+               function: str,
+               function_blocks: Iterable[FunctionBlock],
+               template_block: FunctionBlock,
+               harness_groups: Any) -> str:
+        blocks = [template_block] + list(function_blocks)
+        names = set()
+        type_roots = set()
+        identifiers = set()
+        enum_matches = []
+        out_types = set()
+        for function_block in blocks:
+            for argument in function_block.arguments.values():
+                for arg in argument:
+                    for type in (arg.arg_type, arg.data_type):
+                        names.add(type)
+                        type_roots.add(type)
+                        type_roots.add(remove_ref_symbols(type))
+                        out_types.add(remove_ref_symbols(type))
+                    for value in [arg.assignment, arg.usage] + list(arg.potential_outputs or []):
+                        if value:
+                            names.add(value)
+                            identifiers.update(_identifiers.findall(value))
+                    enum_match = enum_index(self.enums).find(arg.arg_type, arg.assignment or '', arg.usage or '')
+                    enum_matches.append(None if enum_match is None else
+                                        [enum_match[0], list(enum_match[1].values), enum_match[1].file])
+
+        for type in list(out_types):
+            out_types.update(self.casts.get(type, []))
+        generators = []
+        for out_type in sorted(out_types):
+            for name in self.generators_by_out_type.get(out_type, []):
+                generators.append(name)
+        generator_entries = []
+        for name in sorted(set(generators)):
+            generator_block = self.generators[name]
+            generator_entries.append([name, generator_block.to_dict()])
+            for argument in generator_block.arguments.values():
+                for type in (argument[0].arg_type, argument[0].data_type):
+                    type_roots.add(remove_ref_symbols(type))
+
+        chains = set()
+        for name in names | identifiers:
+            chains.update(self.resolution_chain(name))
+            for hop in self.resolution_chain(name):
+                type_roots.add(self.aliases.get(hop, ''))
+        types = set()
+        for root in type_roots:
+            types.update(self.reachable_types(root))
+
+        document = [
+            source_digest(),
+            function,
+            self.flags,
+            self.shared,
+            harness_groups,
+            [function_block.to_dict() for function_block in blocks],
+            sorted(chains),
+            [self.describe_macro(name) for name in sorted((names | identifiers | chains) & self.macros.keys())],
+            [self.describe_type(type) for type in sorted(types)],
+            [[type, self.casts.get(type, [])] for type in sorted(out_types)],
+            enum_matches,
+            generator_entries,
+        ]
+        return hashlib.sha256(json.dumps(document, sort_keys=True, default=str).encode()).hexdigest()
@@ -1,40 +1,52 @@
 import argparse
 import json
 import os
-from typing import Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
-def parse_inf_file(file_path):
+#
+# Whether the .inf is a library UEFI applications can link against (it has a
+# LIBRARY_CLASS without module types or with UEFI_APPLICATION among them), and
+# the library classes listed in its first [LibraryClasses] section, read in a
+# single pass over the file
+#
+def parse_inf(inf_path: str) -> Tuple[bool, list]:
+    if not os.path.isfile(inf_path):
+        return False, []
+    usable = False
     libclasses = set()
-    with open(file_path, 'r') as file:
+    with open(inf_path, 'r') as file:
         inside_library_classes = False
+        library_classes_done = False
         for line in file:
+            if 'LIBRARY_CLASS' in line and ("|" not in line or 'UEFI_APPLICATION' in line):
+                usable = True
+            if library_classes_done:
+                continue
+
             # Check if we are inside the [LibraryClasses] section
             if 'LibraryClasses' in line:
                 inside_library_classes = True
                 continue  # Skip the [LibraryClasses] line itself
 
-            # Stop if another section starts
+            # Stop collecting if another section starts
             if inside_library_classes and (line.startswith('[') or line.startswith('<')):
-                break
+                library_classes_done = True
+                continue
 
-            # If inside [LibraryClasses] and not an empty line, split by '|'
-            if inside_library_classes and line.strip():
-                # Split the line based on '|'
-                if not line.strip().startswith('#'):
-                    libclasses.add(line.strip())
-    return list(libclasses)
-
-def is_uefi_app_lib(lib_name):
-    if os.path.exists(lib_name) and os.path.isfile(lib_name):
-        with open(lib_name, 'r') as file:
-            for line in file:
-                if 'LIBRARY_CLASS' in line and "|" not in line:
-                    return True
-                elif 'LIBRARY_CLASS' in line and 'UEFI_APPLICATION' in line:
-                    return True
-    return False
+            if inside_library_classes and line.strip() and not line.strip().startswith('#'):
+                libclasses.add(line.strip())
+    if not usable:
+        return False, []
+    return True, list(libclasses)
 
-def parse_library_classes_section(file_path: str, root: str, lib_map: Dict[str, Dict[str, list]]) -> Dict[str, Dict[str, list]]:
+#
+# (library class, .inf path) pairs listed in the [LibraryClasses] section of a
+# .dsc/.inc file, in the order they are listed
+#
+def parse_library_classes(file_path: str) -> List[List[str]]:
+    library_classes = []
     with open(file_path, 'r') as file:
         inside_library_classes = False
         for line in file:
@@ -54,19 +66,120 @@ def parse_library_classes_section(file_path: str, root: str, lib_map: Dict[str,
                 if len(parts) > 1 and not line.strip().startswith('#'):
                     # Remove extra spaces from each part
                     parts = [part.strip() for part in parts]
-                    # Add to the library map
-                    if "pei" not in parts[1].lower() and parts[0] not in lib_map.keys():
-                        if is_uefi_app_lib(os.path.join(root, parts[1])):
-                            if ((parts[0] in lib_map.keys()) and ("null" not in parts[1].lower())) or parts[0] not in lib_map.keys() :
-                                lib_map[parts[0]] = {"path": parts[1], "dependencies": parse_inf_file(os.path.join(root, parts[1]))}
+                    if "pei" not in parts[1].lower():
+                        library_classes.append([parts[0], parts[1]])
+    return library_classes
+
+#
+# Add the libraries of library_classes to lib_map, the first definition of a
+# library class wins
+#
+def add_library_classes(library_classes: List[List[str]], root: str, lib_map: Dict[str, Dict[str, list]],
+                        library: Callable[[str], Tuple[bool, list]] = parse_inf) -> Dict[str, Dict[str, list]]:
+    for library_class, inf_path in library_classes:
+        if library_class not in lib_map.keys():
+            usable, dependencies = library(os.path.join(root, inf_path))
+            if usable:
+                lib_map[library_class] = {"path": inf_path, "dependencies": dependencies}
     return lib_map
 
-def parse_edk2(folder_path: str) -> Dict[str, Dict[str, list]]:
+def parse_library_classes_section(file_path: str, root: str, lib_map: Dict[str, Dict[str, list]]) -> Dict[str, Dict[str, list]]:
+    return add_library_classes(parse_library_classes(file_path), root, lib_map)
+
+# Directories that never hold platform descriptions: build output, git
+# metadata and the build tool configuration
+PRUNED_DIRECTORIES = {'Build', '.git', 'Conf'}
+
+#
+# .dsc/.inc files and the directories to descend into, in listing order. Like
+# os.walk, symlinked directories are not followed and unreadable directories
+# are skipped.
+#
+def list_directory(directory: str) -> Tuple[List[str], List[str]]:
+    files = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if entry.name not in PRUNED_DIRECTORIES and not entry.is_symlink():
+                        subdirectories.append(entry.path)
+                elif entry.name.endswith('.dsc') or entry.name.endswith('.inc'):
+                    files.append(entry.path)
+    except OSError:
+        pass
+    return files, subdirectories
+
+#
+# .dsc/.inc files below folder_path in the order os.walk lists them
+#
+def find_platform_files(folder_path: str) -> List[str]:
+    found = []
+    pending = [folder_path]
+    while pending:
+        files, subdirectories = list_directory(pending.pop())
+        found.extend(files)
+        pending.extend(reversed(subdirectories))
+    return found
+
+#
+# The top level directories are crawled side by side and their files put back
+# in walk order
+#
+def crawl_platform_files(folder_path: str, executor: ThreadPoolExecutor) -> List[str]:
+    found, subdirectories = list_directory(folder_path)
+    for files in executor.map(find_platform_files, subdirectories):
+        found.extend(files)
+    return found
+
+#
+# Library map of the tree, parsed on a thread pool. Every .dsc/.inc is parsed up
+# front, then the candidate .inf files of the library classes are read in
+# rounds: round n reads the n-th listed .inf of every class still without a
+# usable one. A class ends up with the first usable .inf in crawl order and the
+# map is filled in the order the serial crawl would have added the classes.
+#
+def parse_edk2(folder_path: str, manifest: Optional['LibraryManifest'] = None, jobs: Optional[int] = None,
+               inf_cache: Optional['InfCache'] = None) -> Dict[str, Dict[str, list]]:
+    read_classes = parse_library_classes if manifest is None else manifest.library_classes
+    if inf_cache is None:
+        inf_cache = InfCache(folder_path) if manifest is None else manifest.inf_cache
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        platform_files = crawl_platform_files(folder_path, executor)
+        if manifest is not None:
+            manifest.crawled(platform_files)
+        # (position in crawl order, inf path) of every definition of a class
+        candidates: Dict[str, List[Tuple[int, str]]] = {}
+        position = 0
+        for library_classes in executor.map(read_classes, platform_files):
+            for library_class, inf_path in library_classes:
+                candidates.setdefault(library_class, []).append((position, inf_path))
+                position += 1
+
+        chosen: Dict[str, Tuple[int, str, list]] = {}
+        pending = list(candidates.keys())
+        attempt = 0
+        while pending:
+            inf_files = list(dict.fromkeys(os.path.join(folder_path, candidates[library_class][attempt][1]) for library_class in pending))
+            libraries = dict(zip(inf_files, executor.map(inf_cache.library, inf_files)))
+            still_pending = []
+            for library_class in pending:
+                position, inf_path = candidates[library_class][attempt]
+                usable, dependencies = libraries[os.path.join(folder_path, inf_path)]
+                if usable:
+                    chosen[library_class] = (position, inf_path, dependencies)
+                elif attempt + 1 < len(candidates[library_class]):
+                    still_pending.append(library_class)
+            pending = still_pending
+            attempt += 1
+
     libmap = {}
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith('.dsc') or file.endswith('.inc'):
-                libmap.update(parse_library_classes_section(os.path.join(root, file), folder_path, libmap))
+    for library_class, (_, inf_path, dependencies) in sorted(chosen.items(), key=lambda item: item[1][0]):
+        libmap[library_class] = {"path": inf_path, "dependencies": dependencies}
     return libmap
 
 def clean_libmap(lib_map: dict) -> dict:
@@ -84,10 +197,160 @@ def save_libmap_json(file_path: str, lib_map: dict):
         json.dump(lib_map, file, indent=4)
 
 
-def generate_libmap(edk2_path: str, output_file: str) -> Dict[str, Dict[str, list]]:
-    lib_map = parse_edk2(edk2_path)
+# Bump whenever the parsing above changes so manifests written by an older
+# version are never reused
+LIBMAP_MANIFEST_VERSION = 1
+
+def file_state(file_path: str) -> list:
+    try:
+        stat = os.stat(file_path)
+        return [stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        return [None, None]
+
+#
+# parse_inf results by .inf path for a whole crawl, optionally seeded with the
+# results of an earlier run which are reused while the file keeps its size and
+# mtime. The same .inf is listed by many .dsc/.inc files, it is still only read
+# once.
+#
+class InfCache:
+    def __init__(self, root: str, known: Optional[Dict[str, list]] = None):
+        self.root = os.path.abspath(root)
+        self.known = known or {}
+        self.entries: Dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+        # Files are parsed on the crawler's thread pool
+        self.lock = threading.Lock()
+
+    def library(self, inf_path: str) -> Tuple[bool, list]:
+        name = os.path.relpath(inf_path, self.root)
+        with self.lock:
+            entry = self.entries.get(name)
+        if entry is None:
+            state = file_state(inf_path)
+            entry = self.known.get(name)
+            if entry is None or entry[:2] != state:
+                entry = state + list(parse_inf(inf_path))
+                with self.lock:
+                    self.misses += 1
+                    entry = self.entries.setdefault(name, entry)
+                return entry[2], entry[3]
+            with self.lock:
+                entry = self.entries.setdefault(name, entry)
+        with self.lock:
+            self.hits += 1
+        return entry[2], entry[3]
+
+    #
+    # Whether exactly the known .inf files were read and none of them changed
+    #
+    def unchanged(self) -> bool:
+        return self.misses == 0 and self.entries.keys() == self.known.keys()
+
+    def summary(self) -> str:
+        return f'INFO: .inf cache: {self.hits} hits, {self.misses} misses'
+
+#
+# What the last crawl read from every .dsc/.inc and .inf file, with the size and
+# mtime each file had back then. Files that still match are not parsed again,
+# and when none of them changed (and no .dsc/.inc came or went) the saved
+# libmap.json is the library map.
+#
+class LibraryManifest:
+    def __init__(self, edk2_path: str, manifest_file: str):
+        self.edk2_path = os.path.abspath(edk2_path)
+        self.manifest_file = manifest_file
+        self.known_files: Dict[str, list] = {}
+        known_libraries: Dict[str, list] = {}
+        self.known_libmap = None
+        self.files: Dict[str, list] = {}
+        self.crawl_order: List[str] = []
+        self.files_read = 0
+        # Files are parsed on the crawler's thread pool
+        self.lock = threading.Lock()
+        try:
+            if os.path.exists(manifest_file):
+                with open(manifest_file, 'r') as file:
+                    manifest = json.load(file)
+                if manifest.get("Version") == LIBMAP_MANIFEST_VERSION and manifest.get("Root") == self.edk2_path:
+                    self.known_files = manifest["Files"]
+                    known_libraries = manifest["Libraries"]
+                    self.known_libmap = manifest["Libmap"]
+        except Exception as e:
+            print(f'WARNING: Ignoring unreadable library map manifest {manifest_file}: {e}')
+        self.inf_cache = InfCache(self.edk2_path, known_libraries)
+
+    def library_classes(self, file_path: str) -> List[List[str]]:
+        name = os.path.relpath(file_path, self.edk2_path)
+        state = file_state(file_path)
+        known = self.known_files.get(name)
+        if known is not None and known[:2] == state:
+            library_classes = known[2]
+        else:
+            library_classes = parse_library_classes(file_path)
+            with self.lock:
+                self.files_read += 1
+        with self.lock:
+            self.files[name] = state + [library_classes]
+        return library_classes
+
+    #
+    # Keep the .dsc/.inc entries in crawl order, whatever order they were
+    # parsed in
+    #
+    def crawled(self, file_paths: List[str]) -> None:
+        self.crawl_order = [os.path.relpath(file_path, self.edk2_path) for file_path in file_paths]
+
+    #
+    # Whether the crawl saw exactly what the saved libmap.json was built from
+    #
+    def unchanged(self, output_file: str) -> bool:
+        return (self.files_read == 0 and self.crawl_order == list(self.known_files.keys()) and
+                self.inf_cache.unchanged() and self.known_libmap == file_state(output_file))
+
+    def save(self, output_file: str) -> None:
+        manifest = {"Version": LIBMAP_MANIFEST_VERSION, "Root": self.edk2_path, "Libmap": file_state(output_file),
+                    "Files": {name: self.files[name] for name in self.crawl_order}, "Libraries": self.inf_cache.entries}
+        tmp_file = f'{self.manifest_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump(manifest, file)
+        os.replace(tmp_file, self.manifest_file)
+
+    def summary(self) -> str:
+        return (f'INFO: Library map: {self.files_read} of {len(self.files)} .dsc/.inc files parsed, '
+                f'.inf cache: {self.inf_cache.hits} hits, {self.inf_cache.misses} misses')
+
+def manifest_file_for(output_file: str) -> str:
+    return os.path.splitext(output_file)[0] + '.manifest.json'
+
+def generate_libmap(edk2_path: str, output_file: str, reuse: bool = True, jobs: Optional[int] = None) -> Dict[str, Dict[str, list]]:
+    if not reuse:
+        inf_cache = InfCache(edk2_path)
+        lib_map = parse_edk2(edk2_path, jobs=jobs, inf_cache=inf_cache)
+        print(inf_cache.summary())
+        lib_map = clean_libmap(lib_map)
+        print(len(lib_map), "libraries found")
+        save_libmap_json(output_file, lib_map)
+        return lib_map
+
+    manifest = LibraryManifest(edk2_path, manifest_file_for(output_file))
+    lib_map = parse_edk2(edk2_path, manifest, jobs)
+    print(manifest.summary())
+    if manifest.unchanged(output_file):
+        try:
+            with open(output_file, 'r') as file:
+                lib_map = json.load(file)
+            print(len(lib_map), "libraries found")
+            return lib_map
+        except Exception as e:
+            print(f'WARNING: Rebuilding unreadable library map {output_file}: {e}')
     lib_map = clean_libmap(lib_map)
     print(len(lib_map), "libraries found")
     save_libmap_json(output_file, lib_map)
+    try:
+        manifest.save(output_file)
+    except Exception as e:
+        print(f'WARNING: Could not write library map manifest: {e}')
     return lib_map
-
@@ -0,0 +1,57 @@
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+from common.types import services_map
+
+#
+# The functions to harness from input.txt, grouped by harness group
+# (BootServices, RuntimeServices, Protocols, ...) as [(name, guid)] lists like
+# before, plus an index from every function name to the groups it is listed
+# under so membership and group lookups don't scan every group.
+#
+class HarnessFunctions(defaultdict):
+    def __init__(self, *args):
+        super().__init__(list, *args)
+        self.by_name: Dict[str, Dict[str, str]] = {}
+        self.service_groups_seen: Dict[str, List[str]] = {}
+
+    def __reduce__(self):
+        return (self.__class__, (), self.__dict__, None, iter(self.items()))
+
+    def add(self, group: str, name: str, guid: str) -> None:
+        self[group].append((name, guid))
+        # the first guid listed for the function in a group is the one used
+        self.by_name.setdefault(name, {}).setdefault(group, guid)
+
+    def names(self) -> Iterator[str]:
+        return iter(self.by_name)
+
+    def is_harnessed(self, name: str) -> bool:
+        return name in self.by_name
+
+    def in_group(self, name: str, group: str) -> bool:
+        return group in self.by_name.get(name, {})
+
+    #
+    # (group, guid) for every group the function is listed under, in the order
+    # the groups appear in input.txt
+    #
+    def groups(self, name: str) -> List[Tuple[str, str]]:
+        entries = self.by_name.get(name)
+        if entries is None:
+            return []
+        return [(group, entries[group]) for group in self.keys() if group in entries]
+
+    def first_group(self, name: str) -> Optional[str]:
+        groups = self.groups(name)
+        return groups[0][0] if len(groups) > 0 else None
+
+    #
+    # Harness groups a call made through service belongs to, going by the
+    # services_map keys and names that appear in the service
+    #
+    def service_groups(self, service: str) -> List[str]:
+        groups = self.service_groups_seen.get(service)
+        if groups is None:
+            groups = [services_map[key] for key, item in services_map.items() if key in service or item in service]
+            self.service_groups_seen[service] = groups
+        return groups
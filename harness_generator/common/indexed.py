@@ -0,0 +1,97 @@
+from collections import defaultdict
+from operator import is_
+from typing import Any, Callable, Tuple
+
+#
+# Tables (aliases, macros, enums, types, the library map) that hold the indexes
+# derived from their contents. Changing a table drops its indexes and those of
+# the tables that built an index from it, so an index is never handed out for
+# contents it wasn't built from, and it goes away with the table that owns it.
+#
+class Indexed:
+    # name -> (the other tables the index was built from, index)
+    derived_entries = None
+
+    def changed(self) -> None:
+        if self.derived_entries:
+            self.derived_entries.clear()
+        dependents = self.__dict__.pop('dependents', None)
+        if dependents:
+            for owner, name in dependents:
+                if owner.derived_entries:
+                    owner.derived_entries.pop(name, None)
+
+    def derived(self, name: str, builder: Callable[[], Any], others: Tuple = ()) -> Any:
+        value = builder()
+        if self.derived_entries is None:
+            self.derived_entries = {}
+        self.derived_entries[name] = (others, value)
+        for other in others:
+            other.__dict__.setdefault('dependents', []).append((self, name))
+        return value
+
+#
+# The index name built by builder from table and others, or a fresh one when
+# one of the tables doesn't hold its indexes (a plain dict)
+#
+def derived_index(table: Any, name: str, builder: Callable[[], Any], *others: Any) -> Any:
+    entries = getattr(table, 'derived_entries', None)
+    if entries:
+        entry = entries.get(name)
+        if entry is not None and len(entry[0]) == len(others) and all(map(is_, entry[0], others)):
+            return entry[1]
+    if not isinstance(table, Indexed) or not all(isinstance(other, Indexed) for other in others):
+        return builder()
+    return table.derived(name, builder, others)
+
+class IndexedDict(Indexed, dict):
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self.changed()
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self.changed()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self.changed()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.changed()
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self.changed()
+        return super().pop(*args)
+
+    def popitem(self):
+        self.changed()
+        return super().popitem()
+
+    def clear(self) -> None:
+        super().clear()
+        self.changed()
+
+    def copy(self) -> 'IndexedDict':
+        return self.__class__(self)
+
+    # The derived indexes are rebuilt wherever the table is unpickled
+    def __reduce__(self):
+        return (self.__class__, (), None, None, iter(self.items()))
+
+#
+# IndexedDict with the defaultdict behavior of the loaders it replaces,
+# looking up a missing key inserts it (and so counts as a change)
+#
+class IndexedDefaultDict(IndexedDict, defaultdict):
+    def copy(self) -> 'IndexedDefaultDict':
+        return self.__class__(self.default_factory, self)
+
+    def __reduce__(self):
+        return (self.__class__, (self.default_factory,), None, None, iter(self.items()))
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List
+
+#
+# Runs a set of independent loaders on a worker pool. Each loader names the
+# loaders whose results it needs, and is started as soon as all of them have
+# finished, receiving their results positionally in the order they were named.
+#
+class LoadStage:
+    def __init__(self, max_workers: int = None):
+        # Most loaders wait on the disk, so allow more workers than cores
+        self.max_workers = max_workers or min(16, (os.cpu_count() or 1) + 4)
+        self.loaders = {}
+
+    def add(self, name: str, loader: Callable[..., Any], deps: List[str] = []) -> None:
+        if name in self.loaders:
+            raise ValueError(f'Loader {name} was added twice')
+        self.loaders[name] = (loader, list(deps))
+
+    def run(self) -> Dict[str, Any]:
+        for name, (_, deps) in self.loaders.items():
+            for dep in deps:
+                if dep not in self.loaders:
+                    raise ValueError(f'Loader {name} depends on unknown loader {dep}')
+
+        results = {}
+        pending = dict(self.loaders)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Start everything whose dependencies are available
+                for name, (loader, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        running[executor.submit(loader, *[results[dep] for dep in deps])] = name
+                        del pending[name]
+                if not running:
+                    raise ValueError(f'Loaders {", ".join(pending)} have cyclic dependencies')
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # Re-raises the loader's exception, cancelling what hasn't started
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        raise
+        return results
@@ -0,0 +1,61 @@
+from difflib import SequenceMatcher
+from typing import Dict, Tuple
+
+# Same scorer fuzzywuzzy picks: python-Levenshtein when it is installed,
+# otherwise the stdlib SequenceMatcher
+try:
+    import Levenshtein
+except ImportError:
+    Levenshtein = None
+
+#
+# Memoized name similarity on the fuzz.ratio scale (0 - 100). Pairs are first
+# checked against cheap upper bounds of the ratio, the lengths of the names and
+# then the characters they have in common, and the full ratio only runs for the
+# pairs those can't rule out.
+#
+class NameSimilarity:
+    def __init__(self):
+        self.scores: Dict[Tuple[str, str], int] = {}
+        self.decisions: Dict[Tuple[str, str, int], bool] = {}
+
+    #
+    # fuzz.ratio(first, second)
+    #
+    def ratio(self, first: str, second: str) -> int:
+        if first is None or second is None:
+            return 0
+        if first == second:
+            return 100
+        if len(first) == 0 or len(second) == 0:
+            return 0
+        key = (first, second)
+        score = self.scores.get(key)
+        if score is None:
+            if Levenshtein is not None:
+                score = int(round(100 * Levenshtein.ratio(first, second)))
+            else:
+                score = int(round(100 * SequenceMatcher(None, first, second).ratio()))
+            self.scores[key] = score
+        return score
+
+    #
+    # Whether fuzz.ratio(first, second) > threshold
+    #
+    def similar(self, first: str, second: str, threshold: int) -> bool:
+        if first is None or second is None or first == second or len(first) == 0 or len(second) == 0:
+            return self.ratio(first, second) > threshold
+        key = (first, second, threshold)
+        decision = self.decisions.get(key)
+        if decision is None:
+            # Both scorers count the matching characters of the two names, so
+            # neither can score above what the lengths or the shared characters allow
+            matcher = SequenceMatcher(None, first, second)
+            if int(round(100 * matcher.real_quick_ratio())) <= threshold or int(round(100 * matcher.quick_ratio())) <= threshold:
+                decision = False
+            else:
+                decision = self.ratio(first, second) > threshold
+            self.decisions[key] = decision
+        return decision
+
+name_similarity = NameSimilarity()
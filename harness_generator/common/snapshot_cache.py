@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from typing import Any, Callable, List, Tuple
+
+# Packages the snapshot builders run code from. A snapshot holds what the
+# builder produced, so changing that code has to miss the cache just like
+# changing one of its input files does.
+SOURCE_PACKAGES = ('common', 'data_analysis')
+
+_source_digest = None
+
+#
+# sha256 over the source of SOURCE_PACKAGES, worked out once per process
+#
+def source_digest() -> str:
+    global _source_digest
+    if _source_digest is None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        digest = hashlib.sha256()
+        for package in SOURCE_PACKAGES:
+            directory = os.path.join(root, package)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.py'):
+                    digest.update(f'{package}/{name}'.encode())
+                    with open(os.path.join(directory, name), 'rb') as file:
+                        digest.update(file.read())
+        _source_digest = digest.hexdigest()
+    return _source_digest
+
+#
+# Content addressed cache for the fully built analyzer inputs. Every snapshot is
+# keyed on the fingerprints (size, mtime and content hash) of the files it was
+# built from, any parameters that changed how it was built and the source of
+# the code that built it, so a warm run skips the json decoding and object
+# construction entirely.
+#
+class SnapshotCache:
+    def __init__(self, cache_dir: str, enabled: bool = True, max_entries: int = 64, max_bytes: int = 2 << 30):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.fingerprints = {}
+        # Loaders may share one cache from several threads
+        self.lock = threading.Lock()
+        self.fingerprint_file = os.path.join(cache_dir, 'fingerprints.json')
+        if self.enabled:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                if os.path.exists(self.fingerprint_file):
+                    with open(self.fingerprint_file, 'r') as file:
+                        self.fingerprints = json.load(file)
+            except Exception as e:
+                print(f'WARNING: Disabling the input cache: {e}')
+                self.enabled = False
+
+    #
+    # The content hash is only recomputed when the size or mtime of the file moved
+    #
+    def fingerprint(self, path: str) -> str:
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return f'{path}:missing'
+        with self.lock:
+            known = self.fingerprints.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return f'{path}:{known[2]}'
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+        with self.lock:
+            self.fingerprints[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return f'{path}:{digest.hexdigest()}'
+
+    def key(self, name: str, inputs: List[str], params: Tuple) -> str:
+        digest = hashlib.sha256(f'{source_digest()}:{name}:{params!r}'.encode())
+        for path in inputs:
+            digest.update(self.fingerprint(path).encode())
+        return digest.hexdigest()
+
+    #
+    # Return the snapshot for name if its inputs are unchanged, otherwise build
+    # it with builder and store the result for the next run
+    #
+    def load(self, name: str, inputs: List[str], builder: Callable[[], Any], params: Tuple = ()) -> Any:
+        if not self.enabled:
+            return builder()
+
+        entry = os.path.join(self.cache_dir, f'{name}-{self.key(name, inputs, params)[:32]}.pickle')
+        if os.path.exists(entry):
+            try:
+                with open(entry, 'rb') as file:
+                    data = pickle.load(file)
+                # Touch the entry so eviction sees it as recently used
+                os.utime(entry)
+                with self.lock:
+                    self.hits += 1
+                return data
+            except Exception as e:
+                print(f'WARNING: Ignoring unreadable cache entry {entry}: {e}')
+
+        with self.lock:
+            self.misses += 1
+        data = builder()
+        try:
+            tmp_entry = f'{entry}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_entry, 'wb') as file:
+                pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_entry, entry)
+            with self.lock:
+                self.save_fingerprints()
+                self.evict()
+        except Exception as e:
+            print(f'WARNING: Could not write cache entry {entry}: {e}')
+        return data
+
+    def save_fingerprints(self) -> None:
+        tmp_file = f'{self.fingerprint_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump(self.fingerprints, file)
+        os.replace(tmp_file, self.fingerprint_file)
+
+    #
+    # Least recently used eviction, bounded by both entry count and total size
+    #
+    def evict(self) -> None:
+        entries = []
+        for file in os.listdir(self.cache_dir):
+            if file.endswith('.pickle'):
+                stat = os.stat(os.path.join(self.cache_dir, file))
+                entries.append((stat.st_mtime, stat.st_size, file))
+        entries.sort(reverse=True)
+        total_bytes = 0
+        for index, (_, size, file) in enumerate(entries):
+            total_bytes += size
+            if index >= self.max_entries or total_bytes > self.max_bytes:
+                os.remove(os.path.join(self.cache_dir, file))
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return 'INFO: Input cache disabled'
+        return f'INFO: Input cache: {self.hits} hits, {self.misses} misses'
@@ -0,0 +1,190 @@
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+from common.types import FieldInfo, TypeInfo, scalable_params
+from common.indexed import derived_index
+
+# Struct nesting the harness will still fill in field by field, a type at
+# nesting level 0 may hold structs of structs of scalars but no deeper
+MAX_STRUCT_DEPTH = 2
+
+_ref_symbols = re.compile(r" *\*| *&")
+_type_qualifiers = re.compile(r'\b(?:struct|union|enum|const|CONST|volatile)\b|\[[^\]]*\]')
+
+#
+# What the type graph knows about one type: how deep its struct nesting goes
+# before everything is a scalar (None when it never bottoms out in scalars)
+#
+class TypeFacts:
+    __slots__ = ('depth',)
+
+    def __init__(self, depth: Optional[int]):
+        self.depth = depth
+
+#
+# Tarjan's strongly connected components over the part of a graph reachable
+# from root, without recursion. Components come out dependencies first and
+# nodes in done are treated as already finished.
+#
+def strongly_connected(root, successors: Callable[[object], Iterable], done) -> List[List]:
+    components = []
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    work = [(root, iter(successors(root)))]
+    index[root] = lowlink[root] = 0
+    stack.append(root)
+    on_stack.add(root)
+    while work:
+        node, children = work[-1]
+        advanced = False
+        for child in children:
+            if child in done:
+                continue
+            if child not in index:
+                index[child] = lowlink[child] = len(index)
+                stack.append(child)
+                on_stack.add(child)
+                work.append((child, iter(successors(child))))
+                advanced = True
+                break
+            if child in on_stack:
+                lowlink[node] = min(lowlink[node], index[child])
+        if advanced:
+            continue
+        work.pop()
+        if work:
+            parent = work[-1][0]
+            lowlink[parent] = min(lowlink[parent], lowlink[node])
+        if lowlink[node] == index[node]:
+            component = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                component.append(member)
+                if member == node:
+                    break
+            components.append(component)
+    return components
+
+#
+# Fuzzability and struct cycles worked out over the whole type graph rather than
+# by re-walking the fields of every argument. Each query finishes the strongly
+# connected components reachable from the type asked about, so every type is
+# analyzed once and later queries are lookups. types may be a lazy TypeStore,
+# only the types that are reachable from a query get decoded.
+#
+class TypeGraph:
+    def __init__(self, aliases: Dict[str, str], types: Dict[str, TypeInfo]):
+        self.aliases = aliases
+        self.types = types
+        self.facts: Dict[str, TypeFacts] = {}
+        self.cycles: Dict[str, bool] = {}
+
+    def is_scalar(self, type: str) -> bool:
+        return any(param.lower() in type.lower() for param in scalable_params)
+
+    #
+    # Edges of the fuzzability graph: an alias stands for what it aliases and
+    # a struct is made of its fields, type names are taken exactly as written
+    #
+    def members(self, type: str) -> List[str]:
+        if self.is_scalar(type):
+            return []
+        if type in self.aliases.keys():
+            return [self.aliases[type]]
+        if type in self.types.keys():
+            return [field_info.type for field_info in self.types[type].fields]
+        return []
+
+    def type_facts(self, type: str) -> TypeFacts:
+        facts = self.facts.get(type)
+        if facts is not None:
+            return facts
+        for component in strongly_connected(type, self.members, self.facts):
+            if len(component) > 1 or component[0] in self.members(component[0]):
+                # Whatever is on a cycle never bottoms out in scalars
+                for member in component:
+                    self.facts[member] = TypeFacts(None)
+                continue
+            member = component[0]
+            self.facts[member] = self.combine(member)
+        return self.facts[type]
+
+    def combine(self, type: str) -> TypeFacts:
+        if self.is_scalar(type):
+            return TypeFacts(0)
+        if type in self.aliases.keys():
+            return TypeFacts(self.facts[self.aliases[type]].depth)
+        if type in self.types.keys() and len(self.types[type].fields) > 0:
+            fields = [self.facts[field_info.type] for field_info in self.types[type].fields]
+            if all(facts.depth is not None for facts in fields):
+                return TypeFacts(1 + max(facts.depth for facts in fields))
+        return TypeFacts(None)
+
+    #
+    # How deep the struct nesting of type goes before everything is a scalar,
+    # None when it never bottoms out in scalars
+    #
+    def depth(self, type: str) -> Optional[int]:
+        return self.type_facts(type).depth
+
+    #
+    # Whether type can be filled in with random scalars when it sits at the
+    # given struct nesting level
+    #
+    def fuzzable(self, type: str, level: int = 0) -> bool:
+        depth = self.depth(type)
+        return depth is not None and depth <= MAX_STRUCT_DEPTH - level
+
+    #
+    # Fields the harness reads one by one into a struct argument: those of the
+    # struct itself or, when it has none, of the type it aliases
+    #
+    def struct_fields(self, type: str) -> List[FieldInfo]:
+        name = _ref_symbols.sub('', type)
+        if len(self.types.get(name, TypeInfo()).fields) == 0:
+            name = self.aliases.get(name, None)
+        return self.types[name].fields
+
+    #
+    # Name of the struct a field of the given type refers to, through aliases
+    #
+    def struct_name(self, type: str) -> Optional[str]:
+        name = _type_qualifiers.sub('', _ref_symbols.sub('', type)).strip()
+        seen = set()
+        while name not in self.types.keys() and name in self.aliases.keys() and name not in seen:
+            seen.add(name)
+            name = _type_qualifiers.sub('', _ref_symbols.sub('', self.aliases[name])).strip()
+        return name if name in self.types.keys() else None
+
+    def referenced_structs(self, type: str) -> List[str]:
+        structs = []
+        for field_info in self.types[type].fields:
+            name = self.struct_name(field_info.type)
+            if name is not None:
+                structs.append(name)
+        return structs
+
+    #
+    # Whether the struct type can reach itself through its fields (directly
+    # or through pointers) and so can't be generated all the way down
+    #
+    def in_cycle(self, type: str) -> bool:
+        if type not in self.types.keys():
+            return False
+        if type not in self.cycles:
+            for component in strongly_connected(type, self.referenced_structs, self.cycles):
+                cyclic = len(component) > 1 or component[0] in self.referenced_structs(component[0])
+                for member in component:
+                    self.cycles[member] = cyclic
+        return self.cycles[type]
+
+    def summary(self) -> str:
+        fuzzable = sum(1 for facts in self.facts.values() if facts.depth is not None)
+        cyclic = sum(1 for cyclic in self.cycles.values() if cyclic)
+        return f'INFO: Type graph: {len(self.facts)} types analyzed, {fuzzable} fuzzable, {cyclic} in struct cycles'
+
+# Kept with the aliases until either table changes
+def type_graph(aliases: Dict[str, str], types: Dict[str, TypeInfo]) -> TypeGraph:
+    return derived_index(aliases, 'type_graph', lambda: TypeGraph(aliases, types), types)
@@ -0,0 +1,56 @@
+from typing import Dict, List
+from common.types import Macros
+from common.utils import remove_ref_symbols
+from common.indexed import derived_index
+
+#
+# Where every alias and macro name ends up once its typedef/#define chain is
+# followed to the end, worked out once for the whole aliases.json/macros.json
+# pair so resolving a type is a single lookup. Aliases win over macros of the
+# same name, like they do when the chain is walked hop by hop. A chain that
+# loops back on itself is reported and cut at the hop that closes the loop.
+#
+class TypeResolution:
+    def __init__(self, aliases: Dict[str, str], macros: Dict[str, Macros]):
+        self.resolved: Dict[str, str] = {}
+        self.cycles: List[List[str]] = []
+        for name in aliases.keys():
+            self.resolve_chain(name, aliases, macros)
+        for name in macros.keys():
+            self.resolve_chain(name, aliases, macros)
+
+    def resolve_chain(self, name: str, aliases: Dict[str, str], macros: Dict[str, Macros]) -> None:
+        if name in self.resolved:
+            return
+        path = []
+        on_path = set()
+        current = name
+        value = None
+        while True:
+            path.append(current)
+            on_path.add(current)
+            value = aliases[current] if current in aliases.keys() else macros[current].value
+            target = remove_ref_symbols(value)
+            if target in self.resolved:
+                value = self.resolved[target]
+                break
+            if target in on_path:
+                cycle = path[path.index(target):] + [target]
+                self.cycles.append(cycle)
+                print(f'WARNING: Type alias cycle {" -> ".join(cycle)}, stopping at {value}')
+                break
+            if target not in aliases.keys() and target not in macros.keys():
+                break
+            current = target
+        for hop in path:
+            self.resolved[hop] = value
+
+    #
+    # The type data_type is an alias or macro for, or data_type itself
+    #
+    def underlying(self, data_type: str) -> str:
+        return self.resolved.get(remove_ref_symbols(data_type), data_type)
+
+# Kept with the aliases until either table changes
+def type_resolution(aliases: Dict[str, str], macros: Dict[str, Macros]) -> TypeResolution:
+    return derived_index(aliases, 'type_resolution', lambda: TypeResolution(aliases, macros), macros)
@@ -0,0 +1,121 @@
+import json
+import os
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterator, Tuple
+from common.types import TypeInfo
+from common.utils import iter_json_spans
+from common.indexed import Indexed
+
+#
+# Dict-like view of types.json that only decodes the TypeInfo entries that are
+# actually looked up. A one-time index of where every type sits in the file is
+# kept next to it (types.json.idx) and reused for as long as the file is unchanged.
+# Like the defaultdict it replaces, looking up an unknown type with [] adds an
+# empty entry for it (which counts as a change of the store).
+#
+class TypeStore(Indexed, MutableMapping):
+    def __init__(self, json_file: str, builder: Callable[[dict], TypeInfo]):
+        self.json_file = os.path.abspath(json_file)
+        self.builder = builder
+        self.index = self.load_index()
+        self.decoded = {}
+        self.removed = set()
+
+    #
+    # Map every type name to the byte range of its definition, reusing the
+    # saved index when the size and mtime of the file still match
+    #
+    def load_index(self) -> Dict[str, Tuple[int, int]]:
+        stat = os.stat(self.json_file)
+        index_file = f'{self.json_file}.idx'
+        try:
+            with open(index_file, 'r') as file:
+                saved = json.load(file)
+            if saved['size'] == stat.st_size and saved['mtime_ns'] == stat.st_mtime_ns:
+                return {name: (start, end) for name, start, end in saved['entries']}
+        except Exception:
+            pass
+
+        index = {}
+        # latin-1 maps every byte to one character and newline='' keeps \r\n as
+        # two, so offsets into the text are offsets into the file. Type names
+        # are plain C identifiers.
+        with open(self.json_file, 'r', encoding='latin-1', newline='') as file:
+            for type_data_dict, start, end in iter_json_spans(file, self.json_file):
+                index[type_data_dict['TypeName']] = (start, end)
+        try:
+            tmp_file = f'{index_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'w') as file:
+                json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                           'entries': [[name, start, end] for name, (start, end) in index.items()]}, file)
+            os.replace(tmp_file, index_file)
+        except Exception as e:
+            print(f'WARNING: Could not save the type index {index_file}: {e}')
+        return index
+
+    def decode(self, name: str) -> TypeInfo:
+        start, end = self.index[name]
+        with open(self.json_file, 'rb') as file:
+            file.seek(start)
+            type_info = self.builder(json.loads(file.read(end - start)))
+        self.decoded[name] = type_info
+        return type_info
+
+    def __contains__(self, name) -> bool:
+        return name in self.decoded or (name in self.index and name not in self.removed)
+
+    def __getitem__(self, name):
+        if name in self.decoded:
+            return self.decoded[name]
+        if name in self.index and name not in self.removed:
+            return self.decode(name)
+        self.decoded[name] = []
+        self.changed()
+        return self.decoded[name]
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def __setitem__(self, name, value) -> None:
+        self.decoded[name] = value
+        self.removed.discard(name)
+        self.changed()
+
+    def __delitem__(self, name) -> None:
+        if name not in self:
+            raise KeyError(name)
+        self.decoded.pop(name, None)
+        if name in self.index:
+            self.removed.add(name)
+        self.changed()
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self.index:
+            if name not in self.removed:
+                yield name
+        for name in self.decoded:
+            if name not in self.index:
+                yield name
+
+    #
+    # Store over the same file and index with its own decoded and added
+    # entries, so what is added to the copy doesn't show up in the original
+    #
+    def copy(self) -> 'TypeStore':
+        clone = TypeStore.__new__(TypeStore)
+        clone.json_file = self.json_file
+        clone.builder = self.builder
+        clone.index = self.index
+        clone.decoded = dict(self.decoded)
+        clone.removed = set(self.removed)
+        return clone
+
+    # The derived indexes are rebuilt wherever the store is unpickled
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state.pop('derived_entries', None)
+        state.pop('dependents', None)
+        return state
+
+    def __len__(self) -> int:
+        return len(self.index) - len(self.removed) + sum(1 for name in self.decoded if name not in self.index)
@@ -1,3 +1,4 @@
+import sys
 from typing import List, Dict, Set
 
 default_includes = {
@@ -105,16 +106,33 @@ ignore_constant_keywords = [
     "min"
 ]
 
+#
+# Every call site repeats the same handful of strings (directions, types,
+# variable markers, include paths), so intern them as the objects are built
+# and let all of the call sites share one copy
+#
+def intern_str(value):
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+def intern_list(values):
+    if type(values) is list:
+        values[:] = [intern_str(value) for value in values]
+    return values
+
 class Argument:
+    __slots__ = ('arg_dir', 'arg_type', 'assignment', 'data_type', 'pointer_count', 'usage', 'potential_outputs', 'variable')
+
     def __init__(self, arg_dir: str, arg_type: str, assignment: str, data_type: str, usage: str, variable: str, potential_outputs: List[str] = []):
-        self.arg_dir = arg_dir
-        self.arg_type = arg_type.replace('const ', '')
-        self.assignment = assignment
-        self.data_type = data_type.replace('const ', '')
+        self.arg_dir = intern_str(arg_dir)
+        self.arg_type = intern_str(arg_type.replace('const ', ''))
+        self.assignment = intern_str(assignment)
+        self.data_type = intern_str(data_type.replace('const ', ''))
         self.pointer_count = arg_type.count('*')
-        self.usage = usage
+        self.usage = intern_str(usage)
         self.potential_outputs = potential_outputs
-        self.variable = variable
+        self.variable = intern_str(variable)
 
     def to_dict(self):
         return {
@@ -142,25 +160,29 @@ class EnumDef:
         self.file = file
 
 class Function:
+    __slots__ = ('function', 'return_type', 'arguments', 'file', 'service', 'includes')
+
     def __init__(self, function: str, arguments: List[Argument], return_type: str = "", service: str = "", includes: Set[str] = [], file: str = ""):
-        self.function = function
-        self.return_type = return_type
+        self.function = intern_str(function)
+        self.return_type = intern_str(return_type)
         self.arguments = arguments
-        self.file = file
+        self.file = intern_str(file)
         if service is None:
             service = ""
-        self.service = service
-        self.includes = includes
+        self.service = intern_str(service)
+        self.includes = intern_list(includes)
 
 class FunctionBlock:
+    __slots__ = ('arguments', 'service', 'function', 'includes', 'return_type')
+
     def __init__(self, arguments: Dict[str, List[Argument]], function: str, service: str = "", includes: Set[str] = [], return_type: str = ""):
         self.arguments = arguments
         if service is None:
             service = ""
-        self.service = service
-        self.function = function
-        self.includes = includes
-        self.return_type = return_type
+        self.service = intern_str(service)
+        self.function = intern_str(function)
+        self.includes = intern_list(includes)
+        self.return_type = intern_str(return_type)
 
     def to_dict(self):
         return {
@@ -172,22 +194,28 @@ class FunctionBlock:
         }
 
 class Macros:
+    __slots__ = ('file', 'name', 'value')
+
     def __init__(self, File: str, Name: str, Value: str):
-        self.file = File
+        self.file = intern_str(File)
         self.name = Name
         self.value = Value
 
 
 class FieldInfo:
+    __slots__ = ('name', 'type')
+
     def __init__(self, name: str, type: str):
-        self.name = name
-        self.type = type
+        self.name = intern_str(name)
+        self.type = intern_str(type)
 
 class TypeInfo:
+    __slots__ = ('name', 'fields', 'file')
+
     def __init__(self, name: str = "", fields: List[FieldInfo] = [], file: str = ""):
         self.name = name
         self.fields = fields
-        self.file = file
+        self.file = intern_str(file)
 
 class TypeTracker:
     def __init__(self, arg_type: str, variable: str, pointer_count: int, fuzzable: bool = False):
@@ -195,4 +223,3 @@ class TypeTracker:
         self.name = variable
         self.pointer_count = pointer_count
         self.fuzzable = fuzzable
-        
\ No newline at end of file
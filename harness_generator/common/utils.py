@@ -1,9 +1,141 @@
 import re
 import os
 import json
-from itertools import permutations
-from typing import List, Dict, Set
+import gzip
+import lzma
+import bz2
+from itertools import chain, product
+from typing import Any, List, Dict, Set, Iterable, Iterator, Tuple
 from common.types import FunctionBlock, FieldInfo, Macros, TypeInfo, scalable_params
+from common.type_graph import type_graph
+from common.indexed import derived_index
+
+_json_separators = re.compile(r'[ \t\r\n,]*')
+_json_delimiters = ' \t\r\n,]'
+
+# Compressed variants of the analyzer inputs, recognized by their magic bytes
+# first and by their extension when the file is too short to tell
+_compressed_formats = [
+    (b'\x1f\x8b', '.gz', gzip.open),
+    (b'\xfd7zXZ\x00', '.xz', lzma.open),
+    (b'BZh', '.bz2', bz2.open),
+]
+
+#
+# Find the input to read for path, falling back to a compressed copy of it
+# (path.gz, path.xz or path.bz2) when the uncompressed file isn't there
+#
+def resolve_input(path: str) -> str:
+    if path is None or os.path.exists(path):
+        return path
+    for _, extension, _ in _compressed_formats:
+        if os.path.exists(path + extension):
+            return path + extension
+    return path
+
+def is_compressed(path: str) -> bool:
+    with open(path, 'rb') as file:
+        magic = file.read(6)
+    return any(magic.startswith(signature) or (len(magic) < len(signature) and path.endswith(extension))
+               for signature, extension, _ in _compressed_formats)
+
+#
+# Open an analyzer input for reading, decompressing gzip, xz and bzip2 files
+# on the fly so they never have to be unpacked to disk first
+#
+def open_input(path: str, mode: str = 'r'):
+    with open(path, 'rb') as file:
+        magic = file.read(6)
+    for signature, extension, opener in _compressed_formats:
+        if magic.startswith(signature) or (len(magic) < len(signature) and path.endswith(extension)):
+            return opener(path, 'rt' if mode == 'r' else mode)
+    return open(path, mode)
+
+#
+# True if the (decompressed) input holds no more than limit bytes
+#
+def input_at_most(path: str, limit: int) -> bool:
+    with open_input(path, 'rb') as file:
+        return len(file.read(limit + 1)) <= limit
+
+#
+# Yields the elements of a top level json array one at a time, so large
+# databases never have to be held in memory as a single parsed list.
+# A top level null (what the analysis writes when nothing was captured)
+# yields nothing.
+#
+def iter_json_array(json_file: str, chunk_size: int = 1 << 16) -> Iterator:
+    with open_input(json_file) as file:
+        for element, _, _ in iter_json_spans(file, json_file, chunk_size):
+            yield element
+
+#
+# Same as iter_json_array over an already open file, but also yields where in
+# the stream each element starts and ends
+#
+def iter_json_spans(file, json_file: str, chunk_size: int = 1 << 16) -> Iterator[Tuple[Any, int, int]]:
+    decoder = json.JSONDecoder()
+    buffer = ""
+    base = 0
+    pos = 0
+    eof = False
+    started = False
+
+    # Pull in more of the file, dropping what has already been consumed
+    def fill() -> bool:
+        nonlocal buffer, base, pos, eof
+        if eof:
+            return False
+        chunk = file.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        base += pos
+        pos = 0
+        return True
+
+    while True:
+        # Skip the whitespace and separators between elements
+        while True:
+            pos = _json_separators.match(buffer, pos).end()
+            if pos < len(buffer) or not fill():
+                break
+        if pos >= len(buffer):
+            if started:
+                raise ValueError(f'{json_file}: unterminated json array')
+            return
+
+        if not started:
+            while len(buffer) - pos < 4 and fill():
+                pass
+            if buffer.startswith('null', pos):
+                return
+            if buffer[pos] != '[':
+                raise ValueError(f'{json_file}: expected a json array')
+            started = True
+            pos += 1
+            continue
+
+        if buffer[pos] == ']':
+            return
+
+        # Decode the next element, reading more of the file until it is complete.
+        # A number cut off by the end of the buffer may still decode ("-6." as
+        # -6), so an element only counts once the separator after it is read.
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+                if (end < len(buffer) and buffer[end] in _json_delimiters) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            if not fill():
+                element, end = decoder.raw_decode(buffer, pos)
+                break
+        yield element, base + pos, base + end
+        pos = end
 
 def is_whitespace(s: str) -> bool:
     if s is None:
@@ -26,28 +158,62 @@ def clean_harnesses(clean: bool, dir: str) -> None:
     if clean:
         os.system(f'rm -rf {dir}/GeneratedHarnesses')
 
-def write_sorted_data(sorted_data: Dict[str, Dict[int, List[FunctionBlock]]], filename: str) -> None:
-    output_dict = {
-        function: {
+#
+# Streaming json writers for the analysis dumps. Records are encoded and written
+# one function at a time, either as the usual indented json document or, when
+# compact, as JSON Lines with one record per line. Nothing in the generator
+# reads the dumps back, they are only for inspection.
+#
+def _indented(value) -> str:
+    # json escapes newlines inside strings, so every newline is a line break
+    return json.dumps(value, indent=4).replace('\n', '\n    ')
+
+def write_json_records(records: Iterable, filename: str, compact: bool = False) -> None:
+    with open(filename, 'w') as f:
+        if compact:
+            for record in records:
+                f.write(json.dumps(record, separators=(',', ':')))
+                f.write('\n')
+            return
+        separator = '[\n    '
+        for record in records:
+            f.write(separator)
+            f.write(_indented(record))
+            separator = ',\n    '
+        f.write('[]' if separator == '[\n    ' else '\n]')
+
+def write_json_items(items: Iterable[Tuple[str, Any]], filename: str, compact: bool = False) -> None:
+    with open(filename, 'w') as f:
+        if compact:
+            for key, value in items:
+                f.write(json.dumps({key: value}, separators=(',', ':')))
+                f.write('\n')
+            return
+        separator = '{\n    '
+        for key, value in items:
+            f.write(separator)
+            f.write(f'{json.dumps(key)}: {_indented(value)}')
+            separator = ',\n    '
+        f.write('{}' if separator == '{\n    ' else '\n}')
+
+def write_sorted_data(sorted_data: Dict[str, Dict[int, List[FunctionBlock]]], filename: str, compact: bool = False) -> None:
+    items = (
+        (function, {
             arg_num: [function_block.to_dict()
                       for function_block in function_blocks]
             for arg_num, function_blocks in arg_num_pairs.items()
-        }
+        })
         for function, arg_num_pairs in sorted_data.items()
-    }
-
-    with open(filename, 'w') as f:
-        json.dump(output_dict, f, indent=4)
+    )
+    write_json_items(items, filename, compact)
 
 # write the template to a file
-def write_template(template: Dict[str, FunctionBlock], filename: str) -> None:
-    output_dict = {
-        function: function_block.to_dict()
+def write_template(template: Dict[str, FunctionBlock], filename: str, compact: bool = False) -> None:
+    items = (
+        (function, function_block.to_dict())
         for function, function_block in template.items()
-    }
-
-    with open(filename, 'w') as f:
-        json.dump(output_dict, f, indent=4)
+    )
+    write_json_items(items, filename, compact)
 
 def add_indents(output: List[str], indent: bool) -> List[str]:
     if not indent:
@@ -62,12 +228,10 @@ def gen_file(filename: str, output: List[str]):
     with open(filename, 'w') as f:
         f.writelines([line + '\n' for line in output])
 
-def write_data(filtered_args_dict: Dict[str, FunctionBlock], filename: str) -> None:
-    output_dict = [function_block.to_dict()
-                   for function_block in filtered_args_dict.values()]
-
-    with open(filename, 'w') as f:
-        json.dump(output_dict, f, indent=4)
+def write_data(filtered_args_dict: Dict[str, FunctionBlock], filename: str, compact: bool = False) -> None:
+    records = (function_block.to_dict()
+               for function_block in filtered_args_dict.values())
+    write_json_records(records, filename, compact)
 
 def compile(harness_folder: str):
     os.system(f'clang -w -g -o {harness_folder}/firness_decoder {harness_folder}/FirnessMain_std.c {harness_folder}/FirnessHarnesses_std.c')
@@ -78,73 +242,89 @@ def compile(harness_folder: str):
 def ignore_cast(usage: str) -> str:
     return re.sub(r"\(.*?\)", "", usage)
 
-def remove_casts(input_string: str, 
-                 aliases: Dict[str, str]) -> str:
-    # Define a regular expression pattern to match casts within parentheses
-    pattern = r'\(([^()]+)\)'
+#
+# Regex that finds any of the given names in a string, built from a prefix tree
+# of the names so a search doesn't try every name at every position. Only
+# whether a name occurs matters, so a name that extends another is dropped.
+#
+def contains_any_pattern(names: Iterable[str]) -> re.Pattern:
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node: dict) -> str:
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return re.compile(build(trie) if trie else '(?!)')
+
+#
+# Strips the casts out of an expression. The cast names (the scalar names plus
+# every alias) are compiled into one pattern per alias set and nothing shared
+# is modified, so a call costs the same however long the process has run.
+#
+class CastStripper:
+    casts = re.compile(r'\(([^()]+)\)')
 
-    # Define a function to replace matched casts with their content
-    def replace_cast(match):
+    def __init__(self, aliases: Dict[str, str]):
+        self.cast_names = contains_any_pattern(
+            set(scalable_params) | {alias.lower() for alias in aliases.keys()})
+
+    def replace_cast(self, match: re.Match) -> str:
         cast_contents = match.group(1)
-        check_list = scalable_params
-        check_list.extend([alias.lower() for alias in aliases.keys()])
-        contains_cast = any(cast in cast_contents.lower() for cast in check_list)
-        if contains_cast:
+        if self.cast_names.search(cast_contents.lower()) is not None:
             return ''
         if ' ' in cast_contents:
             return cast_contents
         return ''
 
-    # Use re.sub() to replace the matched casts with their content
-    result = re.sub(pattern, replace_cast, input_string)
-
-    # Remove any remaining parentheses
-    result = result.replace('(', '').replace(')', '')
+    def strip(self, input_string: str) -> str:
+        result = self.casts.sub(self.replace_cast, input_string)
+        # Remove any remaining parentheses
+        return result.replace('(', '').replace(')', '')
 
-    return result
+def remove_casts(input_string: str, 
+                 aliases: Dict[str, str]) -> str:
+    return derived_index(aliases, 'cast_stripper', lambda: CastStripper(aliases)).strip(input_string)
 
 #
-# This function will return a set of all of the stripped usage values
-# only handles conditional statements taht are separated by a pipe
+# Canonical keys of a conditional usage, only handles conditional statements
+# that are separated by a pipe. A key is the sorted tuple of the values, so
+# every ordering of "a|b|c" has the same key, and there is one key for each
+# mix of macro names and macro values the usage could have been written with.
 #
 def get_stripped_usage(usage: str, 
                        macros: Dict[str, Macros],
-                       aliases: Dict[str, str]) -> Set[str]:
-    usages = set()
-
-    tmp = []
+                       aliases: Dict[str, str]) -> Set[Tuple[str, ...]]:
+    choices = []
     for usage_value in usage.split("|"):
-        tmp.append(remove_casts(usage_value.strip(), aliases))
-    # loop through the tmp list and add all of the orderings of the values
-    # example: if the usage is "a|b|c" then add "a|b|c", "b|a|c", "c|a|b", etc.
-    permutations_list = list(permutations(tmp))
-
-    # Convert each permutation tuple back to a list of strings
-    ordered_strings = ['|'.join(perm) for perm in permutations_list]
-
-    # Add all permutations mixed with the macro values to the set
-    # Add the macro values to the set, incase the macro value is used in the conditional
-    # EDK2 tends to redefine the same macro value in different files
-    for permutation in permutations_list:
-        permutation = list(permutation)
-        for index, element in enumerate(permutation):
-            if element in macros.keys():
-                permutation[index] = re.sub(r'\s', '', remove_casts(macros[element].value, aliases))
-                ordered_strings.append('|'.join(permutation))
-    # Convert the list to a set
-    usages.update(set(ordered_strings))
-
-    return usages
+        usage_value = remove_casts(usage_value.strip(), aliases)
+        # EDK2 tends to redefine the same macro value in different files, so
+        # the macro value may be used in the conditional instead of its name
+        if usage_value in macros.keys():
+            macro_value = re.sub(r'\s', '', remove_casts(macros[usage_value].value, aliases))
+            choices.append({(usage_value,), tuple(macro_value.split('|'))})
+        else:
+            choices.append([(usage_value,)])
+    return {tuple(sorted(chain.from_iterable(values))) for values in product(*choices)}
+
+#
+# Key of a usage exactly as it was written, to compare the usages already kept
+# against the get_stripped_usage keys
+#
+def get_usage_key(usage: str) -> Tuple[str, ...]:
+    return tuple(sorted(usage.split("|")))
 
 def contains_usage(usage: str, 
-                   current_usages: Set[str],
+                   current_usages: Set[Tuple[str, ...]],
                    macros: Dict[str, Macros], 
                    aliases: Dict[str, str]) -> bool:
-    usages = get_stripped_usage(remove_casts(usage, aliases), macros, aliases)
-    for use in usages:
-        if use in current_usages:
-            return True
-    return False
+    return not current_usages.isdisjoint(get_stripped_usage(remove_casts(usage, aliases), macros, aliases))
 
 def contains_void_star(s):
     s_no_spaces = s.replace(" ", "").lower()
@@ -155,30 +335,15 @@ def contains_void_star(s):
 #     s_no_spaces = s.replace(" ", "").lower()
 #     return "void*" in s_no_spaces or "void*" in aliases.get(remove_ref_symbols(s), "").replace(" ", "").lower()
 
+#
+# Whether type is a scalar or a struct that bottoms out in scalars within the
+# struct nesting the harness fills in, looked up in the type graph
+#
 def is_fuzzable(type: str,
                 aliases: Dict[str, str],
                 typemap: Dict[str, TypeInfo],
                 level: int) -> bool:
-    if level > 2:
-        return False
-    elif any(param.lower() in type.lower() for param in scalable_params):
-        return True  # If the type is a scalar, then it is fuzzable
-    elif type in aliases.keys():
-        # If the type is an alias, then check the alias
-        return is_fuzzable(aliases[type], aliases, typemap, level)
-    elif type in typemap.keys():
-        fuzzable = False
-        for field_info in typemap[type].fields:
-            # If any of the fields are scalars, then the type is fuzzable
-            # one level deep
-            if is_fuzzable(field_info.type, aliases, typemap, level + 1):
-                fuzzable = True
-            else:
-                fuzzable = False
-                break
-        return fuzzable
-
-    return False
+    return type_graph(aliases, typemap).fuzzable(type, level)
 
 def print_function_block(function_block: FunctionBlock) -> None:
     print('----------------------------------------------')
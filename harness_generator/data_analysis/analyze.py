@@ -1,13 +1,26 @@
 import json
 import os
+import io
 import copy
-from fuzzywuzzy import fuzz
 import math
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict, Counter
-from typing import List, Dict, Tuple, Set
-from common.types import FunctionBlock, FieldInfo, TypeInfo, EnumDef, Function, Argument, Macros, scalable_params, services_map, type_defs, known_contant_variables, ignore_constant_keywords, default_includes, default_libraries
-from common.utils import remove_ref_symbols, write_data, get_union, is_whitespace, contains_void_star, contains_usage, get_stripped_usage, is_fuzzable, get_intersect, print_function_block
-from common.generate_library_map import generate_libmap
+from typing import List, Dict, Iterator, Tuple
+from common.types import FunctionBlock, FieldInfo, TypeInfo, EnumDef, Function, Argument, Macros, scalable_params, type_defs, known_contant_variables, ignore_constant_keywords, default_includes, default_libraries
+from common.utils import iter_json_array, open_input, resolve_input, input_at_most, remove_ref_symbols, write_data, get_union, is_whitespace, contains_void_star, contains_usage, get_stripped_usage, get_usage_key, is_fuzzable, get_intersect, print_function_block
+from data_analysis.loaders import load_shared, load_include_deps, load_libmap, load_aliases, load_enums, load_macros, load_types, load_castings
+from data_analysis.dependencies import cleanup_paths, update_libs, collect_libraries, library_index, include_order
+from common.snapshot_cache import SnapshotCache
+from common.load_stage import LoadStage
+from common.call_store import CallSiteStore
+from common.call_table import CallSiteTable
+from common.similarity import name_similarity
+from common.type_resolution import type_resolution
+from common.type_graph import type_graph
+from common.harness_functions import HarnessFunctions
+from common.enum_index import enum_index
+from common.function_cache import FunctionCache, FunctionInputs
 
 current_args_dict = defaultdict(list)
 all_includes = set()
@@ -18,7 +31,7 @@ total_generators = set()
 # name but different number of params
 def load_generator_declares(json_file: str) -> Dict[str, Tuple[str, str]]:
     try:
-        with open(json_file, 'r') as file:
+        with open_input(json_file) as file:
             raw_data = json.load(file)
 
         function_dict = defaultdict(list)
@@ -37,23 +50,11 @@ def load_generator_declares(json_file: str) -> Dict[str, Tuple[str, str]]:
         return {}
 
 
-def load_include_deps(json_file: str) -> Dict[str, List[str]]:
-    try:
-        with open(json_file, 'r') as file:
-            raw_data = json.load(file)
-        include_dict = defaultdict(list)
-        for raw_include in raw_data:
-            include_dict[raw_include["File"]] = raw_include["Includes"][::-1]
-        return include_dict
-    except Exception as e:
-        print(f'ERROR: {e}')
-        return {}
-
 # Doesn't take into account if multiple function definitions are found with the same
 # name but different number of params
 def load_function_declares(json_file: str) -> Dict[str, Tuple[str, str]]:
     try:
-        with open(json_file, 'r') as file:
+        with open_input(json_file) as file:
             raw_data = json.load(file)
 
         function_dict = defaultdict(list)
@@ -71,44 +72,15 @@ def load_function_declares(json_file: str) -> Dict[str, Tuple[str, str]]:
         print(f'ERROR: {e}')
         return {}
 
-def load_libmap(edk2_dir: str, output_file: str) -> Dict[str, Dict[str, list]]:
-    try:
-        return generate_libmap(edk2_dir, output_file)
-    except Exception as e:
-        print(f'ERROR: {e}')
-        return {}
-
-#
-# load in the castings
-#
-def load_castings(json_file: str) -> Dict[str, List[str]]:
-    try:
-        with open(json_file, 'r') as file:
-            raw_data = json.load(file)
-        casting_dict = defaultdict(list)
-        for raw_casting in raw_data:
-            # if the type isn't a scalar, then add it to the casting_dict
-            if not any(param.lower() in raw_casting["Type"].lower() for param in scalable_params):
-                casts = raw_casting["Casts"]
-                for cast in casts:
-                    # if the cast isn't a scalar, then add it to the casting_dict
-                    if not any(param.lower() in cast.lower() for param in scalable_params):
-                        casting_dict[raw_casting["Type"]].append(cast)
-        return casting_dict
-    except Exception as e:
-        print(f'ERROR: {e}')
-        return {}
-
-
 #
 # load in the functions to be harnessed
 #
-def load_functions(function_file: str) -> Dict[str, List[Tuple[str, str]]]:
+def load_functions(function_file: str) -> HarnessFunctions:
     # Load in the functions to be harnessed from the txt file
     # They are classified into 3 categories: OtherFunctions, BootServices, and RuntimeServices
-    with open(function_file, 'r') as file:
+    with open_input(function_file) as file:
         data = file.readlines()
-    function_dict = defaultdict(list)
+    function_dict = HarnessFunctions()
     current_service = ""
     for line in data:
         if line.strip() != "":
@@ -119,136 +91,168 @@ def load_functions(function_file: str) -> Dict[str, List[Tuple[str, str]]]:
                 continue
             else:
                 if ':' in line:
-                    function_dict[current_service].append(
-                        (line.split(':')[1].strip(), line.split(':')[0].strip()))
+                    function_dict.add(current_service, line.split(':')[1].strip(), line.split(':')[0].strip())
                 else:
-                    function_dict[current_service].append((line.strip(), ""))
+                    function_dict.add(current_service, line.strip(), "")
     return function_dict
 
 
-def sort_data(input_data: Dict[str, List[FunctionBlock]],
-              harness_functions: Dict[str, List[Tuple[str, str]]],
-              best_guess: bool,
-              function_decl: Dict[str, Tuple[str, str]]) -> Dict[str, List[FunctionBlock]]:
-    
-    filtered_data = defaultdict(list)
-
-    if len(input_data) > 0:
-        sorted_data = {}
-        # Determine the most common number of parameters for each function
-        most_common_param_counts = {}
-        for function, function_blocks in input_data.items():
-            param_counts = Counter(len(fb.arguments) for fb in function_blocks)
-            most_common_param_counts[function] = param_counts
-
-        # group the data based on the number of parameters
-        # and TODO: add a check for the parameters themselves
-        # i.e. if there are multiple functions with the same number of parameters
-        # then the arg_dir and arg_type must match
-        # Also, if the most common param count isn't at least 50% of the total number of the different param counts
-        # then don't keep any of the functions
-        for function, param_counts in most_common_param_counts.items():
-            if param_counts.most_common(1)[0][1] < math.floor(len(input_data[function]) / 2):
-                print(f'WARNING: {function} has too many different parameter counts to be harnessed!!')
+#
+# Decide which parameter count groups of each function are kept for harnessing.
+# group_stats maps every function to {param count: (number of call sites, services
+# they were made through)} in the order they were first seen, and the kept
+# (function, param count) pairs are returned in the order they should be added
+#
+def select_call_groups(group_stats: Dict[str, Dict[int, Tuple[int, List[str]]]],
+                       harness_functions: HarnessFunctions,
+                       best_guess: bool) -> List[Tuple[str, int]]:
+    sorted_data = {}
+    # group the data based on the number of parameters
+    # and TODO: add a check for the parameters themselves
+    # i.e. if there are multiple functions with the same number of parameters
+    # then the arg_dir and arg_type must match
+    # Also, if the most common param count isn't at least 50% of the total number of the different param counts
+    # then don't keep any of the functions
+    for function, arg_num_groups in group_stats.items():
+        total = sum(count for count, _ in arg_num_groups.values())
+        if max(count for count, _ in arg_num_groups.values()) < math.floor(total / 2):
+            print(f'WARNING: {function} has too many different parameter counts to be harnessed!!')
+            continue
+        sorted_data[function] = arg_num_groups
+
+    # now loop through the sorted data and keep the groups of elements that have a corresponding service
+    # in the harness_functions dictionary
+    selected = []
+    selected_functions = set()
+    for function, arg_num_groups in sorted_data.items():
+        for arg_num, (_, services) in arg_num_groups.items():
+            if not harness_functions.is_harnessed(function):
+                print(f'WARNING: {function} is not in the harness functions list!!')
                 continue
-            sorted_data[function] = {}
-            if len(param_counts) != 1:
-                for function_block in input_data[function]:
-                    sorted_data[function].setdefault(
-                        len(function_block.arguments), []).append(function_block)
-            else:
-                sorted_data[function].setdefault(param_counts.most_common(1)[
-                                                0][0], []).extend(input_data[function])
-                
-        
-        # now loop through the sorted data and keep the groups of elements that have a corresponding service
-        # in the harness_functions dictionary
-        for function, arg_num_pairs in sorted_data.items():
-            for _, function_blocks in arg_num_pairs.items():
-                if not any(function in pair[0] for pairs in harness_functions.values() for pair in pairs):
-                    print(f'WARNING: {function} is not in the harness functions list!!')
+            # keep the group if one of its calls was made through a service the function is listed under
+            arg_num_match = any(harness_functions.in_group(function, group)
+                                for service in services for group in harness_functions.service_groups(service))
+            if arg_num_match or harness_functions.in_group(function, "OtherFunctions"):
+                selected.append((function, arg_num))
+                selected_functions.add(function)
+    if best_guess:
+        for function, arg_num_groups in sorted_data.items():
+            for arg_num in arg_num_groups:
+                if not harness_functions.is_harnessed(function):
                     continue
-                arg_num_match = False
-                for function_block in function_blocks:
-                    for key, item in services_map.items():
-                        if key in function_block.service or item in function_block.service:
-                            for harness_group in harness_functions[services_map[key]]:
-                                if function in harness_group:
-                                        # print(f'INFO: {function} with {key} parameters has been selected for harnessing!!')
-                                        arg_num_match = True
-                                        break
-                        if arg_num_match:
-                            break
-                    if arg_num_match:
-                        break
-                if arg_num_match:
-                    filtered_data.setdefault(function, []).extend(function_blocks)
-                elif any(function in pair[0] for pair in harness_functions["OtherFunctions"]):
-                    filtered_data.setdefault(function, []).extend(function_blocks)
-        if best_guess:
-            for function, arg_num_pairs in sorted_data.items():
-                for _, function_blocks in arg_num_pairs.items():
-                    if not any(function in pair[0] for pairs in harness_functions.values() for pair in pairs):
-                        continue
-                    if function in filtered_data.keys():
-                        break
-                    filtered_data.setdefault(function, []).extend(function_blocks)
-                
+                if function in selected_functions:
+                    break
+                selected.append((function, arg_num))
+                selected_functions.add(function)
+    return selected
+
+#
+# Add the declared functions that have no usable call sites
+#
+def add_declared_functions(filtered_data: Dict[str, List[FunctionBlock]],
+                           harness_functions: HarnessFunctions,
+                           function_decl: Dict[str, Tuple[str, str]]) -> Dict[str, List[FunctionBlock]]:
     # loop through the filtered data and add the function_decl function if it is not already in the filtered_data
     for function, function_info in function_decl.items():
         if function not in filtered_data.keys():
             if function_info.service == "" or function_info.service is None:
-                # search harness_functions for the function
-                for key, value in harness_functions.items():
-                    if any(function in pair[0] for pair in value):
-                        function_info.service = key
-                        break
+                # the first harness group the function is listed under
+                if harness_functions.is_harnessed(function):
+                    function_info.service = harness_functions.first_group(function)
             filtered_data[function].append(FunctionBlock(function_info.arguments, function, 
                                             function_info.service, function_info.includes, function_info.return_type))
             # all_includes.update(function_info.includes)
     return filtered_data
 
+def sort_data(input_data: Dict[str, List[FunctionBlock]],
+              harness_functions: HarnessFunctions,
+              best_guess: bool,
+              function_decl: Dict[str, Tuple[str, str]]) -> Dict[str, List[FunctionBlock]]:
+    
+    filtered_data = defaultdict(list)
+
+    if len(input_data) > 0:
+        # Count the call sites of every function by their number of parameters
+        # and collect the services of each group on the columnar table
+        table = CallSiteTable.from_data(input_data)
+        group_stats = {}
+        for (function, arg_num), count in table.group_counts('function', 'arg_count').items():
+            group_stats.setdefault(function, {})[arg_num] = (count, [])
+        for function, arg_num, service in table.group_counts('function', 'arg_count', 'service'):
+            group_stats[function][arg_num][1].append(service)
+        for function, arg_num in select_call_groups(group_stats, harness_functions, best_guess):
+            if len(group_stats[function]) == 1:
+                filtered_data[function].extend(input_data[function])
+            else:
+                filtered_data[function].extend(function_block for function_block in input_data[function]
+                                               if len(function_block.arguments) == arg_num)
+
+    return add_declared_functions(filtered_data, harness_functions, function_decl)
+
+#
+# Same as sort_data, but the grouping is done by the call site store and only
+# the call sites of the selected groups are ever built
+#
+def sort_stored_data(store: CallSiteStore,
+                     harness_functions: HarnessFunctions,
+                     best_guess: bool,
+                     function_decl: Dict[str, Tuple[str, str]],
+                     random: bool) -> Dict[str, List[FunctionBlock]]:
+    filtered_data = defaultdict(list)
+    for function, arg_num in select_call_groups(store.group_stats('calls'), harness_functions, best_guess):
+        filtered_data[function].extend(build_function_block(raw_function_block, random)
+                                       for raw_function_block in store.iter_call_sites('calls', function, arg_num))
+    return add_declared_functions(filtered_data, harness_functions, function_decl)
+
+def build_function_block(raw_function_block: dict, random: bool) -> FunctionBlock:
+    arguments = {
+        arg_key: [Argument(**raw_argument)]
+        for arg_key, raw_argument in raw_function_block.get('Arguments', {}).items()
+    }
+    if random:
+        for arg_key, argument in arguments.items():
+            if argument[0].variable in known_contant_variables:
+                argument[0].variable = ""
+    return FunctionBlock(arguments, raw_function_block.get(
+        'Function'), raw_function_block.get('Service'), raw_function_block.get('Include'), raw_function_block.get('ReturnType'))
+
 #
 # Load in the function call database and perform frequency analysis across
 # the function calls to make sure to only keep the function calls that have
 # the same type of input args
 #
 def load_data(json_file: str,
-              harness_functions: Dict[str, List[Tuple[str, str]]],
+              harness_functions: HarnessFunctions,
               macros: Dict[str, Macros],
               random: bool,
               best_guess: bool,
-              function_decl: Dict[str, Tuple[str, str]]) -> Tuple[Dict[str, List[FunctionBlock]], Dict[str, FunctionBlock]]:
-
-    with open(json_file, 'r') as file:
-        raw_data = json.load(file)
-
-    function_dict = defaultdict(list)
-    try:
-        for raw_function_block in raw_data:
-            arguments = {
-                arg_key: [Argument(**raw_argument)]
-                for arg_key, raw_argument in raw_function_block.get('Arguments', {}).items()
-            }
-            if random:
-                for arg_key, argument in arguments.items():
-                    if argument[0].variable in known_contant_variables:
-                        argument[0].variable = ""
-            function_block = FunctionBlock(arguments, raw_function_block.get(
-                'Function'), raw_function_block.get('Service'), raw_function_block.get('Include'), raw_function_block.get('ReturnType'))
-            function_dict[function_block.function].append(function_block)
-    except Exception as e:
-        print(f'ERROR: {e}')
+              function_decl: Dict[str, Tuple[str, str]],
+              store_file: str = None) -> Tuple[Dict[str, List[FunctionBlock]], Dict[str, FunctionBlock]]:
 
     # Check if there is a single most common number of parameters for each function
     # and if not then take the one which has a service matching the harness_functions.keys()
     # note that if RT is in the service name, then it is a runtime service and BS is a boot service
-    filtered_function_dict = sort_data(function_dict, harness_functions, best_guess, function_decl)
+    if store_file is not None:
+        with CallSiteStore(store_file) as store:
+            try:
+                store.ingest('calls', json_file)
+            except Exception as e:
+                print(f'ERROR: {e}')
+            filtered_function_dict = sort_stored_data(store, harness_functions, best_guess, function_decl, random)
+    else:
+        # Stream the call sites straight into the per function grouping instead of
+        # holding the parsed database and the FunctionBlocks at the same time
+        function_dict = defaultdict(list)
+        try:
+            for raw_function_block in iter_json_array(json_file):
+                function_block = build_function_block(raw_function_block, random)
+                function_dict[function_block.function].append(function_block)
+        except Exception as e:
+            print(f'ERROR: {e}')
+        filtered_function_dict = sort_data(function_dict, harness_functions, best_guess, function_decl)
 
-    void_star_data_type_counter = defaultdict(Counter)
     function_template = {}
 
-    # Collect data_type statistics for arg_type of "void *"
     for function, function_blocks in filtered_function_dict.items():
         if function not in function_template:
             function_template[function] = function_blocks[0]        
@@ -271,9 +275,6 @@ def load_data(json_file: str,
                 elif argument[0].usage in macros.keys():
                     argument[0].assignment = macros[argument[0].usage].name
                     argument[0].usage = macros[argument[0].usage].name
-                if contains_void_star(argument[0].arg_type):
-                    void_star_data_type_counter[arg_key].update(
-                        [argument[0].data_type])
                 # Add a check for the services and if there is no service in the template add it
                 if is_whitespace(function_template[function].service) and not is_whitespace(function_block.service):
                     function_template[function].service = function_block.service
@@ -286,24 +287,30 @@ def load_data(json_file: str,
 
     return filtered_function_dict, function_template
 
+#
+# Yields the raw generator call sites, streamed row by row out of the call
+# site store when one is used
+#
+def iter_raw_generators(json_file: str, store_file: str = None) -> Iterator[dict]:
+    if store_file is not None:
+        with CallSiteStore(store_file) as store:
+            store.ingest('generators', json_file)
+            yield from store.iter_call_sites('generators')
+    else:
+        with open_input(json_file) as file:
+            yield from json.load(file)
+
 def load_generators(json_file: str,
-                    macros: Dict[str, Macros]) -> Dict[str, List[FunctionBlock]]:
+                    macros: Dict[str, Macros],
+                    store_file: str = None) -> Dict[str, List[FunctionBlock]]:
 
-    if os.stat(json_file).st_size <= 4:
+    if input_at_most(json_file, 4):
         print("WARNING: No generator functions were captured!!\n")
         return defaultdict(list)
     
-    with open(json_file, 'r') as file:
-        raw_data = json.load(file)            
-
     function_dict = defaultdict(list)
-    for raw_function_block in raw_data:
-        arguments = {
-            arg_key: [Argument(**raw_argument)]
-            for arg_key, raw_argument in raw_function_block.get('Arguments', {}).items()
-        }
-        function_block = FunctionBlock(arguments, raw_function_block.get(
-            'Function'), raw_function_block.get('Service'), raw_function_block.get('Include'), raw_function_block.get('ReturnType'))
+    for raw_function_block in iter_raw_generators(json_file, store_file):
+        function_block = build_function_block(raw_function_block, False)
         if function_block.service == "protocol":
             function_dict[f'{remove_ref_symbols(function_block.arguments["Arg_0"][0].arg_type)}:{function_block.function}'].append(function_block)
         else:
@@ -333,52 +340,6 @@ def load_generators(json_file: str,
     return filtered_function_dict
 
 
-def load_aliases(json_file: str) -> Dict[str, str]:
-    with open(json_file, 'r') as file:
-        raw_data = json.load(file)
-    return raw_data
-
-#
-# Load enums
-#
-def load_enums(json_file: str) -> Dict[str, EnumDef]:
-    with open(json_file, 'r') as file:
-        raw_data = json.load(file)
-    enum_dict = defaultdict(list)
-    for enum in raw_data:
-        enum_def = EnumDef(enum["Name"], enum["Values"], enum["File"])
-        enum_dict[enum["Name"]] = enum_def
-    return enum_dict
-
-#
-# Load Macros
-#
-def load_macros(json_file: str) -> Tuple[Dict[str, Macros], Dict[str, Macros]]:
-    with open(json_file, 'r') as file:
-        raw_data = json.load(file)
-    macros_val = defaultdict()
-    macros_name = defaultdict()
-    for macro in raw_data:
-        macros_val[macro["Value"]] = Macros(**macro)
-        macros_name[macro["Name"]] = Macros(**macro)
-    return macros_val, macros_name
-
-#
-# Load in the type structures
-#
-def load_types(json_file: str) -> Dict[str, TypeInfo]:
-    with open(json_file, 'r') as file:
-        data = json.load(file)
-    type_data_list = defaultdict(list)
-    for type_data_dict in data:
-        fields_list = []
-        for field_dict in type_data_dict['Fields']:
-            field_info = FieldInfo(field_dict['Name'], field_dict['Type'])
-            fields_list.append(field_info)
-        type_data_list[type_data_dict['TypeName']] = TypeInfo(type_data_dict['TypeName'], fields_list, type_data_dict['File'])
-    return type_data_list
-
-
 def variable_fuzzable(input_data: Dict[str, List[FunctionBlock]],
                       types: Dict[str, TypeInfo],
                       pre_processed_data: Dict[str, FunctionBlock],
@@ -425,14 +386,12 @@ def variable_fuzzable(input_data: Dict[str, List[FunctionBlock]],
 # search the enum list for a matching type or assignment/usage
 #
 def find_enum(argument: Argument, enums: Dict[str, EnumDef]) -> str:
-    for enum_name, enum_values in enums.items():
-        if argument.arg_type.lower() in enum_name.lower():
-            all_includes.add(enum_values.file)
-            return enum_name
-        elif any(value.lower() in argument.assignment.lower() or value in argument.usage.lower() for value in enum_values.values):
-            all_includes.add(enum_values.file)
-            return enum_name
-    return argument.usage
+    match = enum_index(enums).find(argument.arg_type, argument.assignment, argument.usage)
+    if match is None:
+        return argument.usage
+    enum_name, enum_values = match
+    all_includes.add(enum_values.file)
+    return enum_name
 
 
 #
@@ -447,6 +406,10 @@ def collect_known_constants(input_data: Dict[str, List[FunctionBlock]],
                             enums: Dict[str, List[str]]) -> Tuple[Dict[str, FunctionBlock], Dict[str, str], set, set]:
     # Keeps track of arg.usage values seen for each function and arg_key
     usage_seen = defaultdict(lambda: defaultdict(list))
+    # Canonical keys of the usage strings in usage_seen, only worked out when a
+    # conditional usage has to be compared against them
+    usage_keys = defaultdict(lambda: defaultdict(set))
+    usage_keyed = defaultdict(lambda: defaultdict(int))
     matched_macros = defaultdict(list)
     protocol_guids = set()
     driver_guids = set()
@@ -518,8 +481,13 @@ def collect_known_constants(input_data: Dict[str, List[FunctionBlock]],
                             usage_seen[function][arg_key].append(guid_arg.usage)
                     # If there are multiple potential outputs, then add each one this would happen if there was masking
                     elif len(argument[0].potential_outputs) > 1:
+                        seen = usage_seen[function][arg_key]
+                        for usage in seen[usage_keyed[function][arg_key]:]:
+                            if isinstance(usage, str):
+                                usage_keys[function][arg_key].add(get_usage_key(usage))
+                        usage_keyed[function][arg_key] = len(seen)
                         for argument_value in argument[0].potential_outputs:
-                            if not contains_usage(argument_value, usage_seen[function][arg_key], macros, aliases):
+                            if not contains_usage(argument_value, usage_keys[function][arg_key], macros, aliases):
                                 new_arg = Argument(argument[0].arg_dir, argument[0].arg_type, argument[0].assignment,
                                                    argument[0].data_type, argument_value, argument[0].variable, [])
                                 pre_processed_data[function].arguments.setdefault(
@@ -552,13 +520,7 @@ def collect_known_constants(input_data: Dict[str, List[FunctionBlock]],
 def get_underlying_type(data_type: str, 
                         aliases: Dict[str, str], 
                         macros: Dict[str, Macros]) -> str:
-    underlying_type = data_type
-    while remove_ref_symbols(underlying_type) in aliases.keys() or remove_ref_symbols(underlying_type) in macros.keys():
-        if remove_ref_symbols(underlying_type) in aliases.keys():
-            underlying_type = aliases[remove_ref_symbols(underlying_type)]
-        elif remove_ref_symbols(underlying_type) in macros.keys():
-            underlying_type = macros[remove_ref_symbols(underlying_type)].value
-    return underlying_type
+    return type_resolution(aliases, macros).underlying(data_type)
 
 #
 # Get fuzzable saves the arguments that take scalar inputs and also saves void * inputs that vary argument type
@@ -632,6 +594,46 @@ def get_directly_fuzzable(input_data: Dict[str, List[FunctionBlock]],
     return pre_processed_data
 
 
+#
+# Index every IN argument of the harnessed functions by the generator OUT types
+# that can feed it: its own (reference stripped) arg_type and data_type plus
+# everything cast-map.json lists as castable to them. Each entry remembers
+# whether it was reached through the arg_type (otherwise it was the data_type),
+# and the entries of a function stay in call site and argument order.
+#
+def build_generator_index(input_data: Dict[str, List[FunctionBlock]],
+                          castings: Dict[str, List[str]]) -> Dict[str, Dict[str, List[Tuple[str, Argument, bool]]]]:
+    index = defaultdict(dict)
+    for function, function_blocks in input_data.items():
+        for function_block in function_blocks:
+            for arg_key, argument in function_block.arguments.items():
+                if argument[0].arg_dir != "IN":
+                    continue
+                arg_type = remove_ref_symbols(argument[0].arg_type)
+                data_type = remove_ref_symbols(argument[0].data_type)
+                by_arg_type = {arg_type, *castings.get(arg_type, [])}
+                by_data_type = {data_type, *castings.get(data_type, [])}
+                for out_type in by_arg_type | by_data_type:
+                    index[out_type].setdefault(function, []).append(
+                        (arg_key, argument[0], out_type in by_arg_type))
+    return index
+
+#
+# Check that all of the input arguments of a generator are fuzzable, going by
+# either their arg_type or their data_type
+#
+def generator_inputs_fuzzable(generator_block: FunctionBlock,
+                              function: str,
+                              by_data_type: bool,
+                              aliases: Dict[str, str],
+                              types: Dict[str, TypeInfo]) -> bool:
+    for arg_key, argument in generator_block.arguments.items():
+        if argument[0].arg_dir == "IN" and arg_key not in current_args_dict[function] and argument[0].variable != "__PROTOCOL__":
+            arg_type = argument[0].data_type if by_data_type else argument[0].arg_type
+            if not is_fuzzable(remove_ref_symbols(arg_type), aliases, types, 0):
+                return False
+    return True
+
 def get_generators(pre_processed_data: Dict[str, FunctionBlock],
                    generators: Dict[str, FunctionBlock],
                    input_data: Dict[str, List[FunctionBlock]],
@@ -640,60 +642,40 @@ def get_generators(pre_processed_data: Dict[str, FunctionBlock],
                    types: Dict[str, TypeInfo]) -> Dict[str, FunctionBlock]:
     global total_generators
     matching_generators = {}  # Dictionary to store the matching generators
+    # Resolve the OUT arguments of the generators against the IN arguments
+    # of the harnessed functions with lookups instead of scanning every call site
+    index = build_generator_index(input_data, castings)
     for func_name, generator_block in generators.items():
         for argument in generator_block.arguments.values():
             # Check if argument direction is OUT
-            if argument[0].arg_dir == "OUT" and not any(param.lower() in argument[0].arg_type.lower() for param in scalable_params):
-                # Look for a matching argument in function_template
-                for func_temp_name, func_temp_blocks in input_data.items():
-                    for func_temp_block in func_temp_blocks:
-                        # Check if the function names are similar
-                        similar = fuzz.ratio(func_name, func_temp_name)
-                        if similar > 65:
-                            continue
-                        for ft_arg_key, ft_argument in func_temp_block.arguments.items():
-                            if not contains_void_star(argument[0].arg_type):
-                                # Check if argument types match and the argument is missing from known_inputs
-                                if ((remove_ref_symbols(argument[0].arg_type) == remove_ref_symbols(ft_argument[0].arg_type) or remove_ref_symbols(argument[0].arg_type) in castings[remove_ref_symbols(ft_argument[0].arg_type)])and #ft_arg_key not in current_args_dict[func_temp_name] and
-                                        ft_argument[0].arg_dir == "IN" and func_name not in matching_generators.setdefault(func_temp_name, [])):
-                                    # Add a check to make sure all of the input arguments are fuzzable
-                                    all_fuzzable = True
-                                    for ft_arg_key2, ft_argument2 in generator_block.arguments.items():
-                                        if ft_argument2[0].arg_dir == "IN" and ft_arg_key2 not in current_args_dict[func_temp_name] and ft_argument2[0].variable != "__PROTOCOL__":
-                                            if not is_fuzzable(remove_ref_symbols(ft_argument2[0].arg_type), aliases, types, 0) :
-                                                all_fuzzable = False
-                                                break
-                                    # If matching generator is found, add it to the matching_generators dictionary
-                                    if all_fuzzable:
-                                        total_generators.add(func_name)
-                                        matching_generators.setdefault(
-                                            func_temp_name, []).append(func_name)
-                                        generator_arg = Argument(
-                                            ft_argument[0].arg_dir, ft_argument[0].arg_type, func_name, ft_argument[0].data_type, ft_argument[0].usage, "__GENERATOR_FUNCTION__")
-                                        # current_args_dict[func_temp_name].append(ft_arg_key)
-                                        all_includes.update(generator_block.includes)
-                                        pre_processed_data[func_temp_name].arguments.setdefault(
-                                            ft_arg_key, []).append(generator_arg)
-                                elif ((remove_ref_symbols(argument[0].arg_type) == remove_ref_symbols(ft_argument[0].data_type) or remove_ref_symbols(argument[0].arg_type) in castings[remove_ref_symbols(ft_argument[0].data_type)])and #ft_arg_key not in current_args_dict[func_temp_name] and
-                                        ft_argument[0].arg_dir == "IN" and func_name not in matching_generators.setdefault(func_temp_name, [])):
-                                    # Add a check to make sure all of the input arguments are fuzzable
-                                    all_fuzzable = True
-                                    for ft_arg_key2, ft_argument2 in generator_block.arguments.items():
-                                        if ft_argument2[0].arg_dir == "IN" and ft_arg_key2 not in current_args_dict[func_temp_name]and ft_argument2[0].variable != "__PROTOCOL__":
-                                            if not is_fuzzable(remove_ref_symbols(ft_argument2[0].data_type), aliases, types, 0) :
-                                                all_fuzzable = False
-                                                break
-                                    # If matching generator is found, add it to the matching_generators dictionary
-                                    if all_fuzzable:
-                                        total_generators.add(func_name)
-                                        matching_generators.setdefault(
-                                            func_temp_name, []).append(func_name)
-                                        generator_arg = Argument(
-                                            ft_argument[0].arg_dir, ft_argument[0].arg_type, func_name, ft_argument[0].data_type, ft_argument[0].usage, "__GENERATOR_FUNCTION__")
-                                        # current_args_dict[func_temp_name].append(ft_arg_key)
-                                        all_includes.update(generator_block.includes)
-                                        pre_processed_data[func_temp_name].arguments.setdefault(
-                                            ft_arg_key, []).append(generator_arg)
+            if argument[0].arg_dir != "OUT" or any(param.lower() in argument[0].arg_type.lower() for param in scalable_params):
+                continue
+            if contains_void_star(argument[0].arg_type):
+                continue
+            for func_temp_name, candidates in index.get(remove_ref_symbols(argument[0].arg_type), {}).items():
+                if func_name in matching_generators.get(func_temp_name, []):
+                    continue
+                # Check if the function names are similar
+                if name_similarity.similar(func_name, func_temp_name, 65):
+                    continue
+                all_fuzzable = {}
+                for ft_arg_key, ft_argument, by_arg_type in candidates:
+                    # A match on the arg_type takes precedence over one on the data_type
+                    by_data_type = not by_arg_type
+                    if by_data_type not in all_fuzzable:
+                        all_fuzzable[by_data_type] = generator_inputs_fuzzable(generator_block, func_temp_name, by_data_type, aliases, types)
+                    # If matching generator is found, add it to the matching_generators dictionary
+                    if all_fuzzable[by_data_type]:
+                        total_generators.add(func_name)
+                        matching_generators.setdefault(
+                            func_temp_name, []).append(func_name)
+                        generator_arg = Argument(
+                            ft_argument.arg_dir, ft_argument.arg_type, func_name, ft_argument.data_type, ft_argument.usage, "__GENERATOR_FUNCTION__")
+                        # current_args_dict[func_temp_name].append(ft_arg_key)
+                        all_includes.update(generator_block.includes)
+                        pre_processed_data[func_temp_name].arguments.setdefault(
+                            ft_arg_key, []).append(generator_arg)
+                        break
     return pre_processed_data
 
 
@@ -738,6 +720,200 @@ def handle_optional_arguments(pre_processed_data: Dict[str, FunctionBlock]) -> D
 
     return pre_processed_data
 
+#
+# The read-only tables of a collect_function_chunk worker, set up once per worker process
+#
+_worker_tables = None
+
+def init_collect_worker(tables: Tuple) -> None:
+    global _worker_tables
+    _worker_tables = tables
+    types, input_generators, aliases, macros, enums, casts, random, harness_functions = tables
+    # Build the lookup tables up front rather than in the first chunk
+    type_resolution(aliases, macros)
+    enum_index(enums)
+
+#
+# Runs the per function analysis for a set of functions on its own. The global
+# include and generator sets only collect what these functions add (and are
+# put back afterwards) and the log is captured, so the result can be merged
+# into another run or cached on its own.
+#
+def collect_isolated(input_data: Dict[str, List[FunctionBlock]],
+                     function_template: Dict[str, FunctionBlock],
+                     tables: Tuple,
+                     verbose: bool = True) -> Tuple:
+    types, input_generators, aliases, macros, enums, casts, random, harness_functions = tables
+    saved_includes = set(all_includes)
+    saved_generators = set(total_generators)
+    all_includes.clear()
+    total_generators.clear()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            result = collect_all_function_arguments(input_data, function_template, types, input_generators,
+                                                    aliases, macros, enums, casts, random, harness_functions,
+                                                    verbose=verbose)
+        return result, function_template, set(all_includes), set(total_generators), log.getvalue()
+    finally:
+        all_includes.clear()
+        all_includes.update(saved_includes)
+        total_generators.clear()
+        total_generators.update(saved_generators)
+
+#
+# Worker side of collect_arguments_in_parallel, either one result for the whole
+# chunk or one per function of the chunk
+#
+def collect_function_chunk(input_data: Dict[str, List[FunctionBlock]],
+                           function_template: Dict[str, FunctionBlock],
+                           per_function: bool = False) -> List[Tuple]:
+    if not per_function:
+        return [collect_isolated(input_data, function_template, _worker_tables)]
+    return [collect_isolated({function: input_data[function]} if function in input_data else {},
+                             {function: function_template[function]}, _worker_tables, False)
+            for function in function_template]
+
+#
+# Copy the state source ended up with into target, so every reference the parent
+# holds to target sees what the worker did to its copy
+#
+def adopt_function_block(target: FunctionBlock, source: FunctionBlock, adopted: Dict[int, Argument]) -> None:
+    if target is source:
+        return
+    for arg_key, arguments in source.arguments.items():
+        for target_arg, source_arg in zip(target.arguments.get(arg_key, []), arguments):
+            for slot in Argument.__slots__:
+                setattr(target_arg, slot, getattr(source_arg, slot))
+            adopted[id(source_arg)] = target_arg
+    for slot in FunctionBlock.__slots__:
+        if slot != 'arguments':
+            setattr(target, slot, getattr(source, slot))
+
+#
+# Merge collect_isolated results, each covering the given functions, back into
+# one analysis result in the order they are given
+#
+def merge_collected(results: List[Tuple[List[str], Tuple]],
+                    function_template: Dict[str, FunctionBlock]) -> Tuple[Dict[str, FunctionBlock], Dict[str, str], set, set]:
+    pre_processed_data = {}
+    matched_macros = {}
+    protocol_guids = set()
+    driver_guids = set()
+    for functions, (result, chunk_template, chunk_includes, chunk_generators, log) in results:
+        print(log, end='')
+        chunk_data, chunk_macros, chunk_protocol_guids, chunk_driver_guids = result
+        adopted = {}
+        for function in functions:
+            adopt_function_block(function_template[function], chunk_template[function], adopted)
+        for function in functions:
+            function_block = chunk_data[function]
+            for arg_key, arguments in function_block.arguments.items():
+                function_block.arguments[arg_key] = [adopted.get(id(arg), arg) for arg in arguments]
+            pre_processed_data[function] = function_block
+        matched_macros.update(chunk_macros)
+        protocol_guids.update(chunk_protocol_guids)
+        driver_guids.update(chunk_driver_guids)
+        all_includes.update(chunk_includes)
+        total_generators.update(chunk_generators)
+    return pre_processed_data, matched_macros, protocol_guids, driver_guids
+
+#
+# Split the functions into contiguous chunks of about the same number of call
+# sites, a few per worker so one slow function doesn't hold up the rest
+#
+def partition_functions(input_data: Dict[str, List[FunctionBlock]],
+                        function_template: Dict[str, FunctionBlock],
+                        chunk_count: int) -> List[List[str]]:
+    functions = list(function_template.keys())
+    total = sum(len(input_data.get(function, [])) + 1 for function in functions)
+    target = max(1, math.ceil(total / chunk_count))
+    chunks = [[]]
+    size = 0
+    for function in functions:
+        if size >= target:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(function)
+        size += len(input_data.get(function, [])) + 1
+    return chunks
+
+#
+# Run the chunks of functions on jobs worker processes, returning the
+# collect_isolated results in function order
+#
+def collect_on_workers(input_data: Dict[str, List[FunctionBlock]],
+                       function_template: Dict[str, FunctionBlock],
+                       tables: Tuple,
+                       jobs: int,
+                       per_function: bool) -> List[Tuple[List[str], Tuple]]:
+    chunks = partition_functions(input_data, function_template, jobs * 4)
+    print(f'INFO: Analyzing {len(function_template)} functions in {len(chunks)} chunks on {jobs} processes')
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_collect_worker, initargs=(tables,)) as executor:
+        futures = [executor.submit(collect_function_chunk,
+                                   {function: input_data[function] for function in chunk if function in input_data},
+                                   {function: function_template[function] for function in chunk},
+                                   per_function)
+                   for chunk in chunks]
+        results = []
+        for chunk, future in zip(chunks, futures):
+            chunk_results = future.result()
+            if per_function:
+                results.extend(([function], result) for function, result in zip(chunk, chunk_results))
+            else:
+                results.append((chunk, chunk_results[0]))
+    return results
+
+#
+# collect_all_function_arguments spread over jobs worker processes. Every
+# function is analyzed independently, so the chunks are merged back in
+# function order and the result is the same as a single process run.
+#
+def collect_arguments_in_parallel(input_data: Dict[str, List[FunctionBlock]],
+                                  function_template: Dict[str, FunctionBlock],
+                                  tables: Tuple,
+                                  jobs: int) -> Tuple[Dict[str, FunctionBlock], Dict[str, str], set, set]:
+    return merge_collected(collect_on_workers(input_data, function_template, tables, jobs, False), function_template)
+
+#
+# collect_all_function_arguments that only analyzes the functions whose inputs
+# changed since an earlier run and takes the rest from the function cache
+#
+def collect_arguments_incrementally(input_data: Dict[str, List[FunctionBlock]],
+                                    function_template: Dict[str, FunctionBlock],
+                                    tables: Tuple,
+                                    jobs: int,
+                                    function_cache: FunctionCache,
+                                    best_guess: bool) -> Tuple[Dict[str, FunctionBlock], Dict[str, str], set, set]:
+    types, input_generators, aliases, macros, enums, casts, random, harness_functions = tables
+    # Work out every key before anything is analyzed, the analysis updates the call sites in place
+    inputs = FunctionInputs(types, input_generators, aliases, macros, enums, casts,
+                            {'random': random, 'best_guess': best_guess})
+    keys = {}
+    results = {}
+    for function, template_block in function_template.items():
+        keys[function] = inputs.digest(function, input_data.get(function, []), template_block,
+                                       harness_functions.groups(function))
+        cached = function_cache.get(keys[function])
+        if cached is not None:
+            results[function] = cached
+
+    changed = [function for function in function_template if function not in results]
+    if len(changed) > 0:
+        changed_data = {function: input_data[function] for function in changed if function in input_data}
+        changed_template = {function: function_template[function] for function in changed}
+        if jobs > 1 and len(changed) > 1:
+            collected = collect_on_workers(changed_data, changed_template, tables, jobs, True)
+        else:
+            collected = [([function], collect_isolated({function: changed_data[function]} if function in changed_data else {},
+                                                       {function: changed_template[function]}, tables, False))
+                         for function in changed]
+        for functions, result in collected:
+            function_cache.put(keys[functions[0]], functions[0], result)
+            results[functions[0]] = result
+    print(function_cache.summary())
+    return merge_collected([([function], results[function]) for function in function_template], function_template)
+
 def collect_all_function_arguments(input_data: Dict[str, List[FunctionBlock]],
                                    function_template: Dict[str, FunctionBlock],
                                    types: Dict[str, TypeInfo],
@@ -747,7 +923,17 @@ def collect_all_function_arguments(input_data: Dict[str, List[FunctionBlock]],
                                    enums: Dict[str, List[str]],
                                    casts: Dict[str, List[str]],
                                    random: bool,
-                                   harness_functions: Dict[str, List[Tuple[str, str]]]) -> Tuple[Dict[str, FunctionBlock], Dict[str, str], set, set]:
+                                   harness_functions: HarnessFunctions,
+                                   jobs: int = 1,
+                                   function_cache: FunctionCache = None,
+                                   best_guess: bool = False,
+                                   verbose: bool = True) -> Tuple[Dict[str, FunctionBlock], Dict[str, str], set, set]:
+    tables = (types, input_generators, aliases, macros, enums, casts, random, harness_functions)
+    if function_cache is not None:
+        return collect_arguments_incrementally(input_data, function_template, tables, jobs, function_cache, best_guess)
+    if jobs > 1 and len(function_template) > 1:
+        return collect_arguments_in_parallel(input_data, function_template, tables, jobs)
+
     # Collect all of the arguments to be passed to the template
     pre_processed_data = initialize_data(function_template)
     pre_processed_data = get_intersect(input_data, pre_processed_data)
@@ -757,7 +943,8 @@ def collect_all_function_arguments(input_data: Dict[str, List[FunctionBlock]],
         # Step 1: Collect the constant arguments
         pre_processed_data, matched_macros, protocol_guids, driver_guids = collect_known_constants(
             input_data, pre_processed_data, macros, aliases, types, enums)
-        print(f'INFO: Collecting known constants complete!!')
+        if verbose:
+            print(f'INFO: Collecting known constants complete!!')
     else:
         protocol_guids = set()
         driver_guids = set()
@@ -765,26 +952,31 @@ def collect_all_function_arguments(input_data: Dict[str, List[FunctionBlock]],
     # Step 2: Collect the fuzzable arguments
     pre_processed_data = get_directly_fuzzable(
         input_data, pre_processed_data, aliases, macros, random)
-    print(f'INFO: Collecting directly fuzzable arguments complete!!')
+    if verbose:
+        print(f'INFO: Collecting directly fuzzable arguments complete!!')
 
     if not random:
         # Step 3: collect the generator functions
         pre_processed_data = get_generators(
             pre_processed_data, input_generators, input_data, aliases, casts, types)
-        print(f'INFO: Collecting generator functions complete!!')
+        if verbose:
+            print(f'INFO: Collecting generator functions complete!!')
 
     # Step 4: Collect the fuzzable structs
     pre_processed_data = variable_fuzzable(
         input_data, types, pre_processed_data, aliases, macros, random)
-    print(f'INFO: Collecting fuzzable structs complete!!')
+    if verbose:
+        print(f'INFO: Collecting fuzzable structs complete!!')
 
     # Step 5: Add the output variables
     pre_processed_data = add_output_variables(
         function_template, pre_processed_data)
-    print(f'INFO: Adding output variables complete!!')
+    if verbose:
+        print(f'INFO: Adding output variables complete!!')
 
     pre_processed_data = handle_optional_arguments(pre_processed_data)  
-    print(f'INFO: Handling optional arguments complete!!')          
+    if verbose:
+        print(f'INFO: Handling optional arguments complete!!')          
 
     # If there are still arguments missing then extend the level for fuzzable structs
     # continue recursively until all arguments have at least one input
@@ -817,12 +1009,9 @@ def collect_all_function_arguments(input_data: Dict[str, List[FunctionBlock]],
     for function, function_block in pre_processed_data.items():
         for arg_key, argument in function_block.arguments.items():
             if len(argument) > 0 and "protocol" in function_block.service.lower():
-                for harness_group, functions in harness_functions.items():
+                for harness_group, guid in harness_functions.groups(function):
                     if "protocol" in harness_group.lower():
-                        for func, guid in functions:
-                            if function in func:
-                                argument[0].usage = guid
-                                break
+                        argument[0].usage = guid
                 break
 
     return pre_processed_data, matched_macros, protocol_guids, driver_guids
@@ -870,23 +1059,25 @@ def remove_unreachable_functions(input_data: Dict[str, FunctionBlock], function_
     return input_data, function_template
 
 def is_cyclic(data_type: str, types: Dict[str, TypeInfo], aliases: Dict[str, str], macros: Dict[str, Macros], enums: Dict[str, List[str]]) -> bool:
-    # check if the data_type is a scalar
-    if is_fuzzable(data_type, aliases, types, 0):
-        return False
-    # check if the data_type is an enum
-    # if is_enum(data_type, enums):
-    #     return False
-    # check if the data_type is a macro
-    if data_type in macros.keys():
-        return False
-    # check if the data_type is a typedef
-    if data_type in aliases.keys():
-        return is_cyclic(aliases[data_type], types, aliases, macros, enums)
-    # check if the data_type is a struct
-    if data_type in types.keys():
-        for field in types[data_type].fields:
-            if data_type.lower() in field.type.lower():
-                return True
+    seen = set()
+    # follow the typedefs, a typedef loop can't be generated either way
+    while data_type not in seen:
+        seen.add(data_type)
+        # check if the data_type is a scalar
+        if is_fuzzable(data_type, aliases, types, 0):
+            return False
+        # check if the data_type is an enum
+        # if is_enum(data_type, enums):
+        #     return False
+        # check if the data_type is a macro
+        if data_type in macros.keys():
+            return False
+        # check if the data_type is a typedef
+        if data_type in aliases.keys():
+            data_type = aliases[data_type]
+            continue
+        # check if the data_type is a struct that can reach itself through its fields
+        return type_graph(aliases, types).in_cycle(data_type)
     return False
 
 def remove_cyclic_dependencies(input_data: Dict[str, FunctionBlock], 
@@ -975,123 +1166,30 @@ def analyze_generators(input_generators: Dict[str, List[FunctionBlock]],
 
     return input_generators, generators, output_template
 
-def sanity_check(processed_data: Dict[str, FunctionBlock], harness_functions: Dict[str, List[Tuple[str, str]]]):
-    for _, input_functions in harness_functions.items():
-        for function, _ in input_functions:
-            if function not in processed_data.keys():
-                print(f"WARNING: {function} was not able to be harnessed!!")
-
-def cleanup_paths(includes):
-    modified_includes = []
-    for include in includes:
-        if include.endswith(".c"):
-            continue
-        # Split the path into its components.
-        components = include.split("/")
-        # Remove the first 3 components.
-        include = "/".join(components[-2:])
-        if len(components) > 4 and "edk2-platforms" not in components[3].lower():
-            if len(include.split("/")) == 2 and "include" in components[-3].lower():
-                modified_includes.append(include)
-    return modified_includes
+def sanity_check(processed_data: Dict[str, FunctionBlock], harness_functions: HarnessFunctions):
+    for function in harness_functions.names():
+        if function not in processed_data.keys():
+            print(f"WARNING: {function} was not able to be harnessed!!")
 
+#
+# Drop the library headers of libraries that are not in the library map and
+# every PPI header
+#
 def update_inc(includes: List[str], libmap: Dict[str, Dict[str, list]]) -> List[str]:
+    index = library_index(libmap)
+    updated_includes = []
     for include in includes:
-        match = False
-        if "library" in include.lower():
-            for lib in libmap.keys():
-                if lib in include:
-                    match = True
-            if not match:
-                includes.remove(include)
+        if "library" in include.lower() and not index.matches_include(include):
+            continue
         if "ppi" in include.lower():
-            includes.remove(include)
-    return includes
-
-def collect_all_lib_deps(libmap: Dict[str, Dict[str, List[str]]], lib: str, collected_deps: Set[str]) -> Set[str]:
-    # Add the current library to the set of collected dependencies
-    collected_deps.add(lib)
-    
-    # Iterate over the dependencies of the current library
-    if lib in libmap.keys():
-        for dep in libmap[lib]["dependencies"]:
-            # If the dependency is not yet collected, recursively collect its dependencies
-            if dep not in collected_deps:
-                collect_all_lib_deps(libmap, dep, collected_deps)
-    
-    return collected_deps
-
-def collect_all_deps_from_libmap(libraries: List[str], libmap: Dict[str, Dict[str, List[str]]]) -> Set[str]:
-    all_libs = set()
-    
-    # Iterate through each library and collect all of its dependencies recursively
-    for lib in libraries:
-        for libdef in libmap.keys():
-            if lib in libdef:
-                all_libs.add(libdef)
-                all_libs = collect_all_lib_deps(libmap, libdef, all_libs)
-    
-    return all_libs
-
-
-# Function to perform topological sort on the graph
-def topological_sort(graph: Dict[str, List[str]]):
-    visited = set()
-    temp_mark = set()
-    sorted_files = []
-
-    def visit(node):
-        if node in visited:
-            return
-        if node in temp_mark:
-            return
-
-        temp_mark.add(node)
-
-        for dep in graph.get(node, []):
-            visit(dep)
-
-        temp_mark.remove(node)
-        visited.add(node)
-        sorted_files.append(node)
-
-    for node in graph:
-        if node not in visited:
-            visit(node)
-
-    return sorted_files[::-1]
-
-def cleanup_include_dep_paths(include_deps: Dict[str, List[str]]):
-    modified_includes = dict()
-    for include, deps in include_deps.items():
-        if include.endswith(".c"):
             continue
-        # Split the path into its components.
-        components = include.split("/")
-        # Remove the first 3 components.
-        include = "/".join(components[-2:])
-        if len(components) > 4 and "edk2-platforms" not in components[3].lower():
-            if len(include.split("/")) == 2 and "include" in components[-3].lower():
-                modified_includes[include] = cleanup_paths(deps)
-    return modified_includes
+        updated_includes.append(include)
+    return updated_includes
 
 # Function to ensure all dependencies are resolved in the correct order
-def handle_include_deps(includes: List[str], include_deps: Dict[str, List[str]]) -> List[str]:
-    # Cleanup the paths in the include dependencies
-    include_deps = cleanup_include_dep_paths(include_deps)
-
-    sorted_graph = topological_sort(include_deps)
-    
-    # Set to store files that are already included
-    included = set()
-
-    # Final ordered list of includes
-    ordered_includes = []
-
-    for file in sorted_graph:
-        if file in includes and file not in included:
-            ordered_includes.append(file)
-            included.add(file)
+def handle_include_deps(includes: List[str], include_positions: Dict[str, int]) -> List[str]:
+    # Includes that are part of the dependency graph, in graph order
+    ordered_includes = sorted({file for file in includes if file in include_positions}, key=include_positions.get)
 
     # reverse the list to ensure that the includes are in the correct order
     ordered_includes.reverse()
@@ -1105,32 +1203,6 @@ def handle_include_deps(includes: List[str], include_deps: Dict[str, List[str]])
     return ordered_includes
 
 
-def update_libs(libraries: List[str], libmap: Dict[str, Dict[str, list]]) -> Dict[str, str]:
-    updated_libs = {}
-    tmp_libs = collect_all_deps_from_libmap(libraries, libmap)
-    for lib in tmp_libs:
-        if lib in libmap.keys():
-            updated_libs[lib] = libmap[lib]["path"]
-    remove_libs = []
-    for lib in updated_libs.keys():
-        if "unittest" in lib.lower():
-            remove_libs.append(lib)
-
-    for lib in remove_libs:
-        del updated_libs[lib]
-
-    return updated_libs
-
-def collect_libraries(includes: List[str]) -> set[str]:
-    libraries = set()
-    for include in includes:
-        lib = include.split("/")[-1]
-        lib = lib[:-2]
-        if 'Lib' in lib:
-            libraries.add(lib)
-
-    return libraries
-
 def natural_sort_key(key):
     # Split the key into a prefix and a numeric suffix
     prefix, suffix = key.split("_", 1)
@@ -1150,22 +1222,62 @@ def analyze_data(macro_file: str,
                  functions: str,
                  generator_decl: str,
                  edk2_dir: str,
-                 include_deps_file: str) -> Tuple[Dict[str, FunctionBlock], Dict[str, FunctionBlock], Dict[str, FunctionBlock], Dict[str, List[FieldInfo]], List[str], Dict[str, str], Dict[str, str], Dict[str, str], set, set, Dict[str, List[str]], int]:
-
-    macros_val, macros_name = load_macros(macro_file)
+                 include_deps_file: str,
+                 use_cache: bool = True,
+                 use_store: bool = False,
+                 compact_output: bool = False,
+                 jobs: int = 1,
+                 use_function_cache: bool = False) -> Tuple[Dict[str, FunctionBlock], Dict[str, FunctionBlock], Dict[str, FunctionBlock], Dict[str, List[FieldInfo]], List[str], Dict[str, str], Dict[str, str], Dict[str, str], set, set, Dict[str, List[str]], int]:
+
+    # Any of the databases may have been shipped compressed
+    macro_file, enum_file, generator_file, input_file, data_file, types_file, alias_file, cast_file, functions, generator_decl, include_deps_file = [
+        resolve_input(path) for path in (macro_file, enum_file, generator_file, input_file, data_file, types_file, alias_file, cast_file, functions, generator_decl, include_deps_file)]
+
+    # Snapshots of the built inputs live next to the call database
+    cache = SnapshotCache(os.path.join(os.path.dirname(os.path.abspath(data_file)), 'cache'), use_cache)
+    # and so does the optional call site store
+    store_file = os.path.join(os.path.dirname(os.path.abspath(data_file)), 'call-sites.sqlite') if use_store else None
+    # The optional per function results are kept next to the generated harnesses
+    function_cache = FunctionCache(os.path.join(os.path.dirname(os.path.abspath(harness_folder)), 'analysis-cache.sqlite')) if use_function_cache else None
     global total_generators
-    cast_map = load_castings(cast_file)
-    enum_map = load_enums(enum_file)
-    generators = load_generators(generator_file, macros_val)
-    harness_functions = load_functions(input_file)
-    libmap = load_libmap(edk2_dir, os.path.join('/'.join(data_file.split("/")[:-1]), 'libmap.json'))
-    function_declares = load_function_declares(functions)
-    generator_declares = load_generator_declares(generator_decl)
-    include_deps = load_include_deps(include_deps_file)
-    data, function_template = load_data(
-        data_file, harness_functions, macros_val, random, best_guess, function_declares)
-    types = load_types(types_file)
-    aliases = load_aliases(alias_file)
+
+    # Most of the inputs are independent of each other, so load them concurrently
+    # and only hold back the ones that need the results of another loader
+    stage = LoadStage()
+    stage.add('macros', lambda: load_shared(cache, 'macros', [macro_file], lambda: load_macros(macro_file)))
+    stage.add('castings', lambda: load_shared(cache, 'castings', [cast_file], lambda: load_castings(cast_file)))
+    stage.add('enums', lambda: load_shared(cache, 'enums', [enum_file], lambda: load_enums(enum_file)))
+    stage.add('generators', lambda macros: cache.load('generators', [generator_file, macro_file], lambda: load_generators(generator_file, macros[0], store_file)),
+              ['macros'])
+    stage.add('harness_functions', lambda: load_functions(input_file))
+    stage.add('libmap', lambda: load_libmap(edk2_dir, os.path.join('/'.join(data_file.split("/")[:-1]), 'libmap.json'), use_cache))
+    stage.add('function_declares', lambda: cache.load('function_declares', [functions], lambda: load_function_declares(functions)))
+    stage.add('generator_declares', lambda: cache.load('generator_declares', [generator_decl], lambda: load_generator_declares(generator_decl)))
+    stage.add('include_order', lambda: load_shared(cache, 'include_order', [include_deps_file], lambda: include_order(load_include_deps(include_deps_file)), (False,)))
+    stage.add('call_data', lambda harness_functions, macros, function_declares: cache.load('call_data', [data_file, input_file, macro_file, functions],
+                                                                                           lambda: load_data(data_file, harness_functions, macros[0], random, best_guess, function_declares, store_file),
+                                                                                           (random, best_guess)),
+              ['harness_functions', 'macros', 'function_declares'])
+    stage.add('types', lambda: load_shared(cache, 'types', [types_file], lambda: load_types(types_file)))
+    stage.add('aliases', lambda: load_shared(cache, 'aliases', [alias_file], lambda: load_aliases(alias_file)))
+    loaded = stage.run()
+
+    macros_val, macros_name = loaded['macros']
+    cast_map = loaded['castings']
+    enum_map = loaded['enums']
+    generators = loaded['generators']
+    harness_functions = loaded['harness_functions']
+    libmap = loaded['libmap']
+    include_positions = loaded['include_order']
+    generator_declares = loaded['generator_declares']
+    data, function_template = loaded['call_data']
+    types = loaded['types']
+    aliases = loaded['aliases']
+    print(cache.summary())
+    # Resolve every alias and macro chain and index the enum values up front,
+    # this is also where alias cycles get reported
+    type_resolution(aliases, macros_name)
+    enum_index(enum_map)
     if not random:
         generators, processed_generators, template = analyze_generators(
             generators, generator_declares, function_template, aliases, macros_name, enum_map, types)
@@ -1179,7 +1291,10 @@ def analyze_data(macro_file: str,
     # (i.e. more than one level of integrated structs) and the basic structs
     # that have all scalable fields will be directly generated with random input
     processed_data, matched_macros, protocol_guids, driver_guids = collect_all_function_arguments(
-        data, function_template, types, processed_generators, aliases, macros_name, enum_map, cast_map, random, harness_functions)
+        data, function_template, types, processed_generators, aliases, macros_name, enum_map, cast_map, random, harness_functions, jobs,
+        function_cache, best_guess)
+    if function_cache is not None:
+        function_cache.close()
 
     # all_includes = get_union(processed_data, processed_generators)
     update_includes = cleanup_paths(all_includes)
@@ -1188,12 +1303,15 @@ def analyze_data(macro_file: str,
     collected_includes = list(set(update_includes) | default_includes)
     collected_includes = update_inc(collected_includes, libmap)
     libraries = update_libs(list(collect_libraries(collected_includes) | default_libraries), libmap)
-    collected_includes = handle_include_deps(collected_includes, include_deps)
+    collected_includes = handle_include_deps(collected_includes, include_positions)
     
+    # The compact dumps are JSON Lines, one function per line
+    dump_extension = 'jsonl' if compact_output else 'json'
     if not random:
         write_data(processed_generators,
-                   f'{harness_folder}/processed_generators.json')
-    write_data(processed_data, f'{harness_folder}/processed_data.json')
+                   f'{harness_folder}/processed_generators.{dump_extension}', compact_output)
+    write_data(processed_data, f'{harness_folder}/processed_data.{dump_extension}', compact_output)
+    print(type_graph(aliases, types).summary())
 
     sanity_check(processed_data, harness_functions)
 
@@ -0,0 +1,175 @@
+from typing import List, Dict, Set
+from common.indexed import derived_index
+
+#
+# Include and library resolution helpers shared by the regular and the SMI analysis
+#
+
+#
+# Reduce absolute header paths to their include form (Library/BaseLib.h). With
+# keep_nested, headers that sit one directory deeper below an Include folder
+# (Protocol/Foo/Bar.h) are kept with three components instead of being dropped.
+#
+def cleanup_paths(includes, keep_nested: bool = False):
+    modified_includes = []
+    for include in includes:
+        if include.endswith(".c"):
+            continue
+        # Split the path into its components.
+        components = include.split("/")
+        # Remove the first 3 components.
+        include = "/".join(components[-2:])
+        if len(components) > 4 and "edk2-platforms" not in components[3].lower():
+            if len(include.split("/")) == 2 and "include" in components[-3].lower():
+                modified_includes.append(include)
+            elif keep_nested:
+                include = "/".join(components[-3:])
+                modified_includes.append(include)
+    return modified_includes
+
+def cleanup_include_dep_paths(include_deps: Dict[str, List[str]], keep_nested: bool = False):
+    modified_includes = dict()
+    for include, deps in include_deps.items():
+        if include.endswith(".c"):
+            continue
+        # Split the path into its components.
+        components = include.split("/")
+        # Remove the first 3 components.
+        include = "/".join(components[-2:])
+        if len(components) > 4 and "edk2-platforms" not in components[3].lower():
+            if len(include.split("/")) == 2 and "include" in components[-3].lower():
+                modified_includes[include] = cleanup_paths(deps, keep_nested)
+            elif keep_nested:
+                include = "/".join(components[-3:])
+                modified_includes[include] = cleanup_paths(deps, keep_nested)
+    return modified_includes
+
+def collect_all_lib_deps(libmap: Dict[str, Dict[str, List[str]]], lib: str, collected_deps: Set[str]) -> Set[str]:
+    # Add the current library to the set of collected dependencies
+    collected_deps.add(lib)
+    
+    # Iterate over the dependencies of the current library
+    if lib in libmap.keys():
+        for dep in libmap[lib]["dependencies"]:
+            # If the dependency is not yet collected, recursively collect its dependencies
+            if dep not in collected_deps:
+                collect_all_lib_deps(libmap, dep, collected_deps)
+    
+    return collected_deps
+
+#
+# Library classes of the library map by name, matched with explicit prefix
+# rules instead of the plain substring tests this replaces:
+#   - a requested name finds the class of that name and the classes that only
+#     put a prefix in front of it, so IoLib finds IoLib, S3IoLib and TcpIoLib
+#   - a header belongs to a library when a path component starts with a class
+#     name, so BaseLib.h, BaseLibInternals.h and BaseLib/ belong to BaseLib
+# A name found only inside a longer one no longer matches: BootServices finds
+# no class (it used to find UefiBootServicesTableLib), and Library/S3SmbusLib.h
+# doesn't belong to SmbusLib unless S3SmbusLib is in the map itself.
+#
+class LibraryIndex:
+    def __init__(self, libmap: Dict[str, Dict[str, List[str]]]):
+        self.libmap = libmap
+        # Suffix -> library classes ending with it, in libmap order
+        self.by_suffix: Dict[str, List[str]] = {}
+        for library_class in libmap.keys():
+            for start in range(len(library_class)):
+                self.by_suffix.setdefault(library_class[start:], []).append(library_class)
+
+    #
+    # The library class called name and the prefixed variants of it
+    #
+    def classes_with(self, name: str) -> List[str]:
+        return self.by_suffix.get(name, [])
+
+    #
+    # Whether a path component of the include starts with a library class name
+    # (Library/UefiLib.h, Library/BaseLibInternals.h)
+    #
+    def matches_include(self, include: str) -> bool:
+        for component in include.split("/"):
+            for end in range(1, len(component) + 1):
+                if component[:end] in self.libmap:
+                    return True
+        return False
+
+# Kept with the library map until it changes
+def library_index(libmap: Dict[str, Dict[str, List[str]]]) -> LibraryIndex:
+    return derived_index(libmap, 'library_index', lambda: LibraryIndex(libmap))
+
+def collect_all_deps_from_libmap(libraries: List[str], libmap: Dict[str, Dict[str, List[str]]]) -> Set[str]:
+    all_libs = set()
+    index = library_index(libmap)
+
+    # Iterate through each library and collect all of its dependencies recursively
+    for lib in libraries:
+        for libdef in index.classes_with(lib):
+            all_libs.add(libdef)
+            all_libs = collect_all_lib_deps(libmap, libdef, all_libs)
+    
+    return all_libs
+
+# Function to perform topological sort on the graph, without recursion so deep
+# include chains can't run into the recursion limit
+def topological_sort(graph: Dict[str, List[str]]):
+    visited = set()
+    temp_mark = set()
+    sorted_files = []
+
+    for root in graph:
+        if root in visited:
+            continue
+        temp_mark.add(root)
+        # (node, iterator over the dependencies still to visit)
+        stack = [(root, iter(graph.get(root, [])))]
+        while stack:
+            node, deps = stack[-1]
+            for dep in deps:
+                if dep not in visited and dep not in temp_mark:
+                    temp_mark.add(dep)
+                    stack.append((dep, iter(graph.get(dep, []))))
+                    break
+            else:
+                stack.pop()
+                temp_mark.remove(node)
+                visited.add(node)
+                sorted_files.append(node)
+
+    return sorted_files[::-1]
+
+#
+# Position of every header of the cleaned includes.json graph in its
+# topological order. Only depends on includes.json, so it is built once per
+# version of the file (the snapshot cache keys it on the file's fingerprint)
+# and ordering the includes of a run is a lookup per include.
+#
+def include_order(include_deps: Dict[str, List[str]], keep_nested: bool = False) -> Dict[str, int]:
+    graph = cleanup_include_dep_paths(include_deps, keep_nested)
+    return {file: position for position, file in enumerate(topological_sort(graph))}
+
+def update_libs(libraries: List[str], libmap: Dict[str, Dict[str, list]]) -> Dict[str, str]:
+    updated_libs = {}
+    tmp_libs = collect_all_deps_from_libmap(libraries, libmap)
+    for lib in tmp_libs:
+        if lib in libmap.keys():
+            updated_libs[lib] = libmap[lib]["path"]
+    remove_libs = []
+    for lib in updated_libs.keys():
+        if "unittest" in lib.lower():
+            remove_libs.append(lib)
+
+    for lib in remove_libs:
+        del updated_libs[lib]
+
+    return updated_libs
+
+def collect_libraries(includes: List[str]) -> set[str]:
+    libraries = set()
+    for include in includes:
+        lib = include.split("/")[-1]
+        lib = lib[:-2]
+        if 'Lib' in lib:
+            libraries.add(lib)
+
+    return libraries
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Callable, List, Dict, Tuple
+from common.types import FieldInfo, TypeInfo, EnumDef, Macros, scalable_params
+from common.utils import open_input, is_compressed
+from common.type_store import TypeStore
+from common.generate_library_map import generate_libmap, save_libmap_json
+from common.snapshot_cache import SnapshotCache
+from common.indexed import IndexedDict, IndexedDefaultDict
+
+#
+# Loaders shared by the regular and the SMI analysis. Their results are kept
+# for the lifetime of the process, so when both harness sets are generated for
+# the same tree every input is only parsed once. Each pass works on its own
+# copy (see private_copy).
+#
+_loaded = {}
+_libmaps = {}
+_loaded_lock = threading.Lock()
+
+def _file_state(path: str) -> Tuple:
+    try:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return (os.path.abspath(path), None, None)
+
+#
+# Every caller gets its own copy of a shared result. The analysis adds entries
+# to the tables it is handed (the defaultdict and TypeStore lookups insert),
+# and what one pass adds must not show up in the next. The copies are shallow,
+# the entries themselves are only ever read.
+#
+def private_copy(data: Any) -> Any:
+    if isinstance(data, tuple):
+        return tuple(private_copy(item) for item in data)
+    if hasattr(data, 'copy'):
+        return data.copy()
+    return data
+
+#
+# Return a copy of the memoized result of a shared loader, falling back to the
+# snapshot cache and finally to builder itself
+#
+def load_shared(cache: SnapshotCache, name: str, inputs: List[str], builder: Callable[[], Any], params: Tuple = ()) -> Any:
+    key = (name, params, tuple(_file_state(path) for path in inputs))
+    with _loaded_lock:
+        if key in _loaded:
+            return private_copy(_loaded[key])
+    data = cache.load(name, inputs, builder, params)
+    with _loaded_lock:
+        return private_copy(_loaded.setdefault(key, data))
+
+def load_include_deps(json_file: str) -> Dict[str, List[str]]:
+    try:
+        with open_input(json_file) as file:
+            raw_data = json.load(file)
+        include_dict = defaultdict(list)
+        for raw_include in raw_data:
+            include_dict[raw_include["File"]] = raw_include["Includes"][::-1]
+        return include_dict
+    except Exception as e:
+        print(f'ERROR: {e}')
+        return {}
+
+def load_libmap(edk2_dir: str, output_file: str, reuse: bool = True) -> Dict[str, Dict[str, list]]:
+    try:
+        edk2_dir = os.path.abspath(edk2_dir)
+        with _loaded_lock:
+            known = _libmaps.get(edk2_dir)
+        if known is None:
+            lib_map = IndexedDict(generate_libmap(edk2_dir, output_file, reuse))
+            with _loaded_lock:
+                _libmaps.setdefault(edk2_dir, (lib_map, os.path.abspath(output_file)))
+            return lib_map.copy()
+        # The tree was already crawled, only make sure the map is saved where asked
+        lib_map, saved_file = known
+        if saved_file != os.path.abspath(output_file):
+            save_libmap_json(output_file, lib_map)
+        return lib_map.copy()
+    except Exception as e:
+        print(f'ERROR: {e}')
+        return {}
+
+def load_aliases(json_file: str) -> Dict[str, str]:
+    with open_input(json_file) as file:
+        raw_data = json.load(file)
+    return IndexedDict(raw_data)
+
+#
+# Load enums
+#
+def load_enums(json_file: str) -> Dict[str, EnumDef]:
+    with open_input(json_file) as file:
+        raw_data = json.load(file)
+    enum_dict = IndexedDefaultDict(list)
+    for enum in raw_data:
+        enum_def = EnumDef(enum["Name"], enum["Values"], enum["File"])
+        enum_dict[enum["Name"]] = enum_def
+    return enum_dict
+
+#
+# Load Macros
+#
+def load_macros(json_file: str) -> Tuple[Dict[str, Macros], Dict[str, Macros]]:
+    with open_input(json_file) as file:
+        raw_data = json.load(file)
+    macros_val = IndexedDefaultDict()
+    macros_name = IndexedDefaultDict()
+    for macro in raw_data:
+        macros_val[macro["Value"]] = Macros(**macro)
+        macros_name[macro["Name"]] = Macros(**macro)
+    return macros_val, macros_name
+
+#
+# Load in the type structures. Plain types.json files are decoded lazily, one
+# type at a time as it is looked up, compressed ones can't be seeked into and
+# are loaded in full.
+#
+def load_types(json_file: str) -> Dict[str, TypeInfo]:
+    if not is_compressed(json_file):
+        return TypeStore(json_file, build_type_info)
+    with open_input(json_file) as file:
+        data = json.load(file)
+    type_data_list = IndexedDefaultDict(list)
+    for type_data_dict in data:
+        type_data_list[type_data_dict['TypeName']] = build_type_info(type_data_dict)
+    return type_data_list
+
+def build_type_info(type_data_dict: dict) -> TypeInfo:
+    fields_list = []
+    for field_dict in type_data_dict['Fields']:
+        field_info = FieldInfo(field_dict['Name'], field_dict['Type'])
+        fields_list.append(field_info)
+    return TypeInfo(type_data_dict['TypeName'], fields_list, type_data_dict['File'])
+
+#
+# load in the castings
+#
+def load_castings(json_file: str) -> Dict[str, List[str]]:
+    try:
+        with open_input(json_file) as file:
+            raw_data = json.load(file)
+        casting_dict = defaultdict(list)
+        for raw_casting in raw_data:
+            # if the type isn't a scalar, then add it to the casting_dict
+            if not any(param.lower() in raw_casting["Type"].lower() for param in scalable_params):
+                casts = raw_casting["Casts"]
+                for cast in casts:
+                    # if the cast isn't a scalar, then add it to the casting_dict
+                    if not any(param.lower() in cast.lower() for param in scalable_params):
+                        casting_dict[raw_casting["Type"]].append(cast)
+        return casting_dict
+    except Exception as e:
+        print(f'ERROR: {e}')
+        return {}
@@ -6,6 +6,7 @@ import json
 from datetime import datetime
 from common.types import FunctionBlock, FieldInfo, EnumDef, scalable_params, SmiInfo
 from common.utils import clean_harnesses, gen_file, compile
+from common.call_table import CallSiteTable
 from data_analysis.analyze import analyze_data
 from data_analysis.analyze_smi import analyze_smi_data
 import path_trace.header_template as tracer_header
@@ -241,27 +242,24 @@ def calculate_statistics(merged_data: Dict[str, FunctionBlock],
                      total_generators: int):
     total_functions = len(merged_data)
 
+    # Classify every argument on the columnar table: the type checks are done
+    # once per distinct type and then counted across all of the arguments
+    table = CallSiteTable.from_data({function: [function_block] for function, function_block in merged_data.items()})
+    last = table.integer_mask('last')
+    is_scalable = table.mask('arg_type', lambda arg_type: any(param.lower() in arg_type.lower() or param.lower() in aliases.get(arg_type, "").lower() for param in scalable_params))
+    is_fuzzable = table.either(is_scalable, table.mask('variable', lambda variable: "__FUZZABLE__" == variable))
+    not_pointer = table.mask('arg_type', lambda arg_type: '*' not in arg_type)
+
     # collect total number of scalable types that aren't pointers
-    total_scalable_types = 0
-    total_pointer_types = 0
-    total_struct_types = 0
-    total_constants = 0
-    enum_list = []
-    for _, function_block in merged_data.items():
-        for _, argument in function_block.arguments.items():
-            is_scalable = any(param.lower() in argument[-1].arg_type.lower() or param.lower() in aliases.get(argument[-1].arg_type, "").lower() for param in scalable_params)
-            if '*' not in argument[-1].arg_type and (is_scalable or "__FUZZABLE__" == argument[-1].variable):
-                total_scalable_types += 1
-            elif (is_scalable or "__FUZZABLE__" == argument[-1].variable):
-                total_pointer_types += 1
-            else:
-                total_struct_types += 1
-            for arg in argument:
-                if "CONSTANT" in arg.variable and arg.arg_dir == "IN":
-                    total_constants += 1
-                elif "__ENUM_ARG__" in arg.variable and arg.arg_type not in enum_list:
-                    total_constants += len(enums.get(arg.arg_type, EnumDef()).values)
-                    enum_list.append(arg.arg_type)
+    total_scalable_types = table.count(table.both(last, table.both(not_pointer, is_fuzzable)))
+    total_pointer_types = table.count(table.both(last, table.both(table.negate(not_pointer), is_fuzzable)))
+    total_struct_types = table.count(table.both(last, table.negate(is_fuzzable)))
+
+    is_constant = table.both(table.mask('variable', lambda variable: "CONSTANT" in variable), table.mask('arg_dir', lambda arg_dir: arg_dir == "IN"))
+    is_enum = table.both(table.negate(is_constant), table.mask('variable', lambda variable: "__ENUM_ARG__" in variable))
+    total_constants = table.count(is_constant)
+    for enum_type in table.distinct('arg_type', is_enum):
+        total_constants += len(enums.get(enum_type, EnumDef()).values)
     
     print(f"Total Functions: {total_functions}")
     print(f"Total Generators: {total_generators}")
@@ -315,8 +313,20 @@ def main():
     parser.add_argument('-b', '--best-guess', dest='best_guess', action='store_true',
                         help='Choose the function match with the highest frequency even if it might not be the right one (default: False)')
     parser.add_argument("--smi", dest="smi_enabled", action="store_true", help="Enable SMI generation")
+    parser.add_argument("--combined", dest="combined", action="store_true",
+                        help="Generate both the regular and the SMI harnesses from a single load of the inputs (default: False)")
     parser.add_argument("--stateful", dest="stateful", action="store_true", help="Enable stateful generation")
     parser.add_argument("--asan", dest="asan", action="store_true", help="Enable ASAN generation")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true",
+                        help="Rebuild every input instead of reusing the cached snapshots (default: False)")
+    parser.add_argument("--compact-output", dest="compact_output", action="store_true",
+                        help="Write the processed data dumps as JSON Lines instead of indented json (default: False)")
+    parser.add_argument("--call-store", dest="call_store", action="store_true",
+                        help="Ingest the call and generator databases into an indexed SQLite store and query it instead of loading every call site (default: False)")
+    parser.add_argument("--function-cache", dest="function_cache", action="store_true",
+                        help="Reuse the per function analysis results of earlier runs for the functions whose inputs did not change (default: False)")
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1,
+                        help="Number of processes the per function analysis is spread over (default: 1)")
     parser.add_argument("-sm", dest="smi", default="/ouput/tmp/smi-function-guid-map.json", 
                         help="Path to the smi file (default: /output/tmp/smi-function-guid-map.json)")
 
@@ -324,19 +334,23 @@ def main():
 
     clean_harnesses(args.clean, args.output)
     harness_folder = generate_harness_folder(args.output)
-    if args.smi_enabled:
-        smi_data, includes, libraries, types, enums, aliases, protocol_guids, driver_guids, matched_macros  = analyze_smi_data(args.macro_file, args.enum_file, args.smi, args.types_file, args.alias_file, args.cast_file, args.random, harness_folder, args.best_guess, args.edk2, args.includes_file)
-        generate_smi_harness(smi_data, types, enums, includes, libraries, aliases, matched_macros, protocol_guids, driver_guids, harness_folder, args.output, args.random, args.stateful, args.asan)
-    else:
+    if not args.smi_enabled or args.combined:
         processed_data, processed_generators, template, types, all_includes, libraries, matched_macros, aliases, protocol_guids, driver_guids, enums, total_generators = analyze_data(args.macro_file, args.enum_file, args.generator_file, args.input_file,
-                                                    args.data_file, args.types_file, args.alias_file, args.cast_file, args.random, harness_folder, args.best_guess, args.function_file, args.generators, args.edk2, args.includes_file)
+                                                    args.data_file, args.types_file, args.alias_file, args.cast_file, args.random, harness_folder, args.best_guess, args.function_file, args.generators, args.edk2, args.includes_file, not args.no_cache, args.call_store, args.compact_output, args.jobs, args.function_cache)
         
         main_dir = os.path.dirname(os.path.abspath(args.data_file))
         calculate_statistics(processed_data, processed_generators, aliases, enums, main_dir, total_generators)
 
         generate_harness(processed_data, template, types, enums,
                         all_includes, libraries, processed_generators, aliases, matched_macros, protocol_guids, driver_guids, harness_folder, args.output, args.random, args.stateful, args.asan)
-    
+    if args.smi_enabled or args.combined:
+        # In combined mode the SMI harnesses get their own folders so they don't
+        # overwrite the regular ones, the inputs loaded for one are reused by the other
+        smi_output = os.path.join(args.output, 'Smi') if args.combined else args.output
+        smi_harness_folder = generate_harness_folder(smi_output) if args.combined else harness_folder
+        smi_data, includes, libraries, types, enums, aliases, protocol_guids, driver_guids, matched_macros  = analyze_smi_data(args.macro_file, args.enum_file, args.smi, args.types_file, args.alias_file, args.cast_file, args.random, smi_harness_folder, args.best_guess, args.edk2, args.includes_file, not args.no_cache)
+        generate_smi_harness(smi_data, types, enums, includes, libraries, aliases, matched_macros, protocol_guids, driver_guids, smi_harness_folder, smi_output, args.random, args.stateful, args.asan)
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
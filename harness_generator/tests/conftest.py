@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules are imported as common.x / data_analysis.x, the same as when
+# main.py is run from the harness_generator folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,109 @@
+import json
+from data_analysis import analyze
+from data_analysis.analyze import collect_all_function_arguments, load_data, load_function_declares, load_functions
+from data_analysis.loaders import load_aliases, load_castings, load_enums, load_macros, load_types
+from common.type_resolution import type_resolution
+
+INPUT_TXT = '''\
+[Protocols]
+    gEfiTimerArchProtocolGuid:TimerDriverSetTimerPeriod
+
+[BootServices]
+    AllocatePages
+
+[RuntimeServices]
+    GetTime
+    SetVariable
+'''
+
+def argument(arg_type, variable, usage='Var', assignment='', arg_dir='IN', potential_outputs=()):
+    return {'arg_dir': arg_dir, 'arg_type': arg_type, 'assignment': assignment, 'data_type': arg_type, 'usage': usage, 'variable': variable,
+            'potential_outputs': list(potential_outputs)}
+
+def call_site(function, service, include, *arguments):
+    return {'Function': function, 'Service': service, 'ReturnType': 'EFI_STATUS', 'Include': [include],
+            'Arguments': {f'Arg_{index}': arg for index, arg in enumerate(arguments)}}
+
+LOCATE_TIMER = 'gBS->LocateProtocol ( &gEfiTimerArchProtocolGuid, NULL, (VOID **)&mTimer )'
+CALL_SITES = [
+    call_site('AllocatePages', 'gBS', '/input/edk2/MdePkg/Include/Library/UefiLib.h',
+              argument('EFI_ALLOCATE_TYPE', '__ENUM_ARG__', 'AllocateAddress', 'AllocateAddress'),
+              argument('EFI_MEMORY_TYPE', '__ENUM_ARG__', 'EfiLoaderCode', 'EfiLoaderCode'),
+              argument('UINTN', '__CONSTANT_INT__', 'EFI_PAGE_SIZE', 'EFI_PAGE_SIZE'),
+              argument('EFI_PHYSICAL_ADDRESS *', 'Ptr', arg_dir='IN_OUT')),
+    call_site('AllocatePages', 'gBS', '/input/edk2/MdePkg/Include/Library/UefiLib.h',
+              argument('EFI_ALLOCATE_TYPE', '__ENUM_ARG__', 'AllocateAnyPages', 'AllocateAnyPages'),
+              argument('EFI_MEMORY_TYPE', '__ENUM_ARG__', 'EfiBootServicesData', 'EfiBootServicesData'),
+              argument('UINTN', 'Pages'),
+              argument('EFI_PHYSICAL_ADDRESS *', 'Var', arg_dir='IN_OUT')),
+    call_site('SetVariable', 'gRT', '/input/edk2/MdePkg/Include/Uefi/UefiSpec.h',
+              argument('CHAR16 *', '__CONSTANT_STRING__', 'L"Timeout"', 'L"Timeout"'),
+              argument('EFI_GUID *', 'gEfiGlobalVariableGuid', '&gEfiGlobalVariableGuid'),
+              # masked flags, each one becomes a value of its own
+              argument('UINT32', 'Attributes', 'EFI_VARIABLE_RUNTIME_ACCESS | EFI_VARIABLE_NON_VOLATILE', 'EFI_VARIABLE_NON_VOLATILE',
+                       potential_outputs=['EFI_VARIABLE_RUNTIME_ACCESS | EFI_VARIABLE_NON_VOLATILE', 'EFI_VARIABLE_RUNTIME_ACCESS',
+                                          'EFI_VARIABLE_NON_VOLATILE']),
+              argument('UINTN', '__CONSTANT_SIZEOF__', 'sizeof (UINTN)', 'sizeof (UINTN)'),
+              argument('VOID *', 'Buffer', 'Buffer')),
+    call_site('TimerDriverSetTimerPeriod', 'protocol', '/input/edk2/MdePkg/Include/Protocol/Timer.h',
+              argument('EFI_TIMER_ARCH_PROTOCOL *', '__PROTOCOL__', 'mTimer', LOCATE_TIMER),
+              argument('UINT64', 'Period')),
+    call_site('GetTime', 'gRT', '/input/edk2/MdePkg/Include/Uefi/UefiSpec.h',
+              argument('EFI_TIME *', 'Time', arg_dir='OUT'),
+              argument('EFI_TIME_CAPABILITIES *', 'Capabilities')),
+]
+
+TABLES = {
+    'macros.json': [{'File': '/input/edk2/MdePkg/Include/Uefi/UefiBaseType.h', 'Name': 'EFI_PAGE_SIZE', 'Value': '0x1000'},
+                    {'File': '/input/edk2/MdePkg/Include/Uefi/UefiMultiPhase.h', 'Name': 'EFI_VARIABLE_NON_VOLATILE', 'Value': '0x00000001'},
+                    {'File': '/input/edk2/MdePkg/Include/Uefi/UefiMultiPhase.h', 'Name': 'EFI_VARIABLE_RUNTIME_ACCESS', 'Value': '0x00000004'}],
+    'enums.json': [{'Name': 'EFI_ALLOCATE_TYPE', 'Values': ['AllocateAnyPages', 'AllocateMaxAddress', 'AllocateAddress'], 'File': '/input/edk2/MdePkg/Include/Uefi/UefiSpec.h'},
+                   {'Name': 'EFI_MEMORY_TYPE', 'Values': ['EfiReservedMemoryType', 'EfiLoaderCode', 'EfiBootServicesData'], 'File': '/input/edk2/MdePkg/Include/Uefi/UefiMultiPhase.h'}],
+    'types.json': [{'TypeName': 'EFI_TIME', 'File': '/input/edk2/MdePkg/Include/Uefi/UefiSpec.h',
+                    'Fields': [{'Name': 'Year', 'Type': 'UINT16'}, {'Name': 'Month', 'Type': 'UINT8'}]},
+                   {'TypeName': 'EFI_TIME_CAPABILITIES', 'File': '/input/edk2/MdePkg/Include/Uefi/UefiSpec.h',
+                    'Fields': [{'Name': 'Resolution', 'Type': 'UINT32'}, {'Name': 'SetsToZero', 'Type': 'BOOLEAN'}]},
+                   {'TypeName': 'EFI_TIMER_ARCH_PROTOCOL', 'File': '/input/edk2/MdePkg/Include/Protocol/Timer.h',
+                    'Fields': [{'Name': 'SetTimerPeriod', 'Type': 'EFI_TIMER_SET_TIMER_PERIOD'}]}],
+    'aliases.json': {'EFI_PHYSICAL_ADDRESS': 'UINT64', 'EFI_STATUS': 'RETURN_STATUS', 'RETURN_STATUS': 'UINTN'},
+    'cast-map.json': [],
+    'functions.json': [],
+}
+
+#
+# Everything collect_all_function_arguments is handed, loaded anew for every
+# run since the analysis updates the call sites in place
+#
+def collect(tmp_path, jobs=1, function_cache=None, random=False, best_guess=False, call_sites=CALL_SITES, tables={}):
+    inputs = tmp_path / 'inputs'
+    inputs.mkdir(exist_ok=True)
+    for name, table in dict(TABLES, **tables).items():
+        (inputs / name).write_text(json.dumps(table))
+    (inputs / 'call-database.json').write_text(json.dumps(call_sites))
+    (inputs / 'input.txt').write_text(INPUT_TXT)
+    harness_functions = load_functions(str(inputs / 'input.txt'))
+    macros_val, macros_name = load_macros(str(inputs / 'macros.json'))
+    data, function_template = load_data(str(inputs / 'call-database.json'), harness_functions, macros_val, random, best_guess,
+                                        load_function_declares(str(inputs / 'functions.json')))
+    aliases = load_aliases(str(inputs / 'aliases.json'))
+    type_resolution(aliases, macros_name)
+    analyze.all_includes.clear()
+    analyze.total_generators.clear()
+    processed_data, matched_macros, protocol_guids, driver_guids = collect_all_function_arguments(
+        data, function_template, load_types(str(inputs / 'types.json')), {}, aliases, macros_name,
+        load_enums(str(inputs / 'enums.json')), load_castings(str(inputs / 'cast-map.json')), random, harness_functions,
+        jobs, function_cache, best_guess, verbose=False)
+    return ({function: function_block.to_dict() for function, function_block in processed_data.items()},
+            {function: function_block.to_dict() for function, function_block in function_template.items()},
+            dict(matched_macros), protocol_guids, driver_guids, set(analyze.all_includes))
+
+def test_same_result_on_one_and_several_processes(tmp_path):
+    serial = collect(tmp_path, 1)
+    parallel = collect(tmp_path, 2)
+    processed_data, function_template, matched_macros, protocol_guids, driver_guids, includes = serial
+    assert list(processed_data) == ['AllocatePages', 'SetVariable', 'TimerDriverSetTimerPeriod', 'GetTime']
+    assert protocol_guids == {'gEfiTimerArchProtocolGuid'}
+    assert driver_guids == {'gEfiGlobalVariableGuid'}
+    assert matched_macros == {'EFI_VARIABLE_NON_VOLATILE': '0x00000001'}
+    assert '/input/edk2/MdePkg/Include/Uefi/UefiMultiPhase.h' in includes
+    assert parallel == serial
@@ -0,0 +1,144 @@
+import random
+from data_analysis.analyze import handle_include_deps
+from data_analysis.dependencies import LibraryIndex, cleanup_include_dep_paths, collect_all_deps_from_libmap, include_order, topological_sort
+
+# Library classes of MdePkg, MdeModulePkg and NetworkPkg
+CLASSES = ['BaseLib', 'BaseMemoryLib', 'DebugLib', 'IoLib', 'S3IoLib', 'PciLib', 'S3PciLib', 'PciSegmentLib',
+           'S3PciSegmentLib', 'SmbusLib', 'UefiLib', 'UefiBootServicesTableLib', 'UefiRuntimeServicesTableLib',
+           'DxeServicesTableLib', 'DxeServicesLib', 'MmServicesTableLib', 'SmmServicesTableLib', 'MemoryAllocationLib',
+           'PrintLib', 'DevicePathLib', 'TcpIoLib', 'UdpIoLib', 'IpIoLib', 'UefiBootManagerLib', 'HobLib', 'PcdLib']
+
+def libmap(dependencies={}):
+    return {name: {'path': f'{name}/{name}.inf', 'dependencies': dependencies.get(name, [])} for name in CLASSES}
+
+def test_a_name_finds_its_prefixed_variants():
+    index = LibraryIndex(libmap())
+    assert index.classes_with('BaseLib') == ['BaseLib']
+    assert index.classes_with('IoLib') == ['IoLib', 'S3IoLib', 'TcpIoLib', 'UdpIoLib', 'IpIoLib']
+    assert index.classes_with('PciLib') == ['PciLib', 'S3PciLib']
+    assert index.classes_with('PciSegmentLib') == ['PciSegmentLib', 'S3PciSegmentLib']
+    # names are matched case sensitively, Smm is no prefix in front of Mm
+    assert index.classes_with('MmServicesTableLib') == ['MmServicesTableLib']
+    assert index.classes_with('ServicesTableLib') == ['UefiBootServicesTableLib', 'UefiRuntimeServicesTableLib', 'DxeServicesTableLib',
+                                                      'MmServicesTableLib', 'SmmServicesTableLib']
+    assert index.classes_with('Lib') == CLASSES
+    assert index.classes_with('S3BootScriptLib') == []
+    # found only inside a longer name, which the substring test used to match
+    assert index.classes_with('BootServices') == []
+    assert index.classes_with('DxeServices') == []
+    assert index.classes_with('Uefi') == []
+
+def test_a_header_belongs_to_the_classes_it_starts_with():
+    index = LibraryIndex(libmap())
+    assert index.matches_include('Library/UefiLib.h')
+    assert index.matches_include('Library/SmmServicesTableLib.h')
+    assert index.matches_include('BaseLib/BaseLibInternals.h')
+    assert index.matches_include('Library/DevicePathLibrary.h')
+    assert not index.matches_include('Protocol/DevicePath.h')
+    assert not index.matches_include('Library/S3BootScriptLib.h')
+    # S3SmbusLib is no class of the map, SmbusLib only sits inside the name
+    assert not index.matches_include('Library/S3SmbusLib.h')
+
+def test_dependencies_of_the_prefixed_variants():
+    libraries = libmap({'S3PciLib': ['PciLib', 'S3BootScriptLib'], 'PciLib': ['PciExpressLib'], 'UefiLib': ['PrintLib']})
+    assert collect_all_deps_from_libmap(['PciLib'], libraries) == {'PciLib', 'S3PciLib', 'PciExpressLib', 'S3BootScriptLib'}
+    assert collect_all_deps_from_libmap(['UefiLib', 'HobLib'], libraries) == {'UefiLib', 'PrintLib', 'HobLib'}
+
+#
+# The recursive depth first search topological_sort replaced
+#
+def recursive_sort(graph):
+    visited = set()
+    temp_mark = set()
+    sorted_files = []
+
+    def visit(node):
+        if node in visited or node in temp_mark:
+            return
+        temp_mark.add(node)
+        for dep in graph.get(node, []):
+            visit(dep)
+        temp_mark.remove(node)
+        visited.add(node)
+        sorted_files.append(node)
+
+    for node in graph:
+        if node not in visited:
+            visit(node)
+    return sorted_files[::-1]
+
+def test_dependencies_come_after_their_includers():
+    graph = {'Uefi.h': ['UefiBaseType.h', 'UefiSpec.h'], 'UefiSpec.h': ['UefiBaseType.h'], 'UefiBaseType.h': ['Base.h']}
+    assert topological_sort(graph) == ['Uefi.h', 'UefiSpec.h', 'UefiBaseType.h', 'Base.h']
+
+def test_same_order_as_recursive_sort():
+    generator = random.Random(1)
+    for _ in range(300):
+        nodes = [f'Header{index}.h' for index in range(generator.randint(1, 12))]
+        graph = {}
+        for node in generator.sample(nodes, generator.randint(1, len(nodes))):
+            # cycles, self includes, repeated and unknown headers included
+            graph[node] = [generator.choice(nodes + ['Missing.h']) for _ in range(generator.randint(0, 4))]
+        assert topological_sort(graph) == recursive_sort(graph)
+
+def test_deep_chain():
+    depth = 200000
+    graph = {f'Header{index}.h': [f'Header{index + 1}.h'] for index in range(depth)}
+    # closing the chain into a cycle must not loop either
+    graph[f'Header{depth}.h'] = ['Header0.h']
+    assert topological_sort(graph) == [f'Header{index}.h' for index in range(depth + 1)]
+
+def test_include_order():
+    include_deps = {
+        '/edk2/MdePkg/Include/Library/UefiLib.h': ['/edk2/MdePkg/Include/Uefi/UefiSpec.h'],
+        '/edk2/MdePkg/Include/Uefi/UefiSpec.h': ['/edk2/MdePkg/Include/Uefi/UefiBaseType.h'],
+        '/edk2/MdePkg/Library/UefiLib/UefiLib.c': ['/edk2/MdePkg/Include/Library/UefiLib.h'],
+    }
+    assert include_order(include_deps) == {'Library/UefiLib.h': 0, 'Uefi/UefiSpec.h': 1, 'Uefi/UefiBaseType.h': 2}
+
+#
+# handle_include_deps before the order was cached: sort the whole cleaned graph,
+# then keep the includes of the run in that order
+#
+def sorted_includes(includes, include_deps):
+    return [file for file in topological_sort(cleanup_include_dep_paths(include_deps)) if file in includes]
+
+#
+# Sort only the headers reachable from the includes of the run
+#
+def reachable_includes(includes, include_deps):
+    graph = cleanup_include_dep_paths(include_deps)
+    reachable = set()
+    stack = [file for file in includes if file in graph]
+    while stack:
+        file = stack.pop()
+        if file not in reachable:
+            reachable.add(file)
+            stack.extend(dep for dep in graph.get(file, []) if dep in graph)
+    subgraph = {file: deps for file, deps in graph.items() if file in reachable}
+    return [file for file in topological_sort(subgraph) if file in includes]
+
+UEFI_INCLUDE_DEPS = {
+    '/edk2/MdePkg/Include/Library/UefiLib.h': ['/edk2/MdePkg/Include/Uefi/UefiSpec.h'],
+    '/edk2/MdePkg/Include/Library/BaseLib.h': [],
+    '/edk2/MdePkg/Include/Uefi/UefiSpec.h': [],
+}
+
+def test_order_needs_the_whole_graph():
+    includes = ['Uefi/UefiSpec.h', 'Library/BaseLib.h']
+    # UefiLib.h isn't included, yet it is what puts UefiSpec.h after BaseLib.h
+    assert sorted_includes(includes, UEFI_INCLUDE_DEPS) == ['Library/BaseLib.h', 'Uefi/UefiSpec.h']
+    assert reachable_includes(includes, UEFI_INCLUDE_DEPS) == ['Uefi/UefiSpec.h', 'Library/BaseLib.h']
+    positions = include_order(UEFI_INCLUDE_DEPS)
+    assert sorted(includes, key=positions.get) == sorted_includes(includes, UEFI_INCLUDE_DEPS)
+
+def test_same_includes_as_sorting_every_run():
+    generator = random.Random(2)
+    headers = [f'/edk2/MdePkg/Include/Library/Header{index}.h' for index in range(10)]
+    for _ in range(200):
+        include_deps = {header: generator.sample(headers, generator.randint(0, 3))
+                        for header in generator.sample(headers, generator.randint(1, len(headers)))}
+        includes = [header.split('Include/')[1] for header in generator.sample(headers, generator.randint(1, 6))]
+        expected = sorted_includes(includes, include_deps)[::-1]
+        expected.insert(1, 'Library/MemoryAllocationLib.h')
+        assert handle_include_deps(includes, include_order(include_deps)) == expected
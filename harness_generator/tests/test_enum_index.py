@@ -0,0 +1,66 @@
+import random
+from common.types import EnumDef
+from common.enum_index import EnumIndex, enum_index
+from common.indexed import IndexedDict
+
+#
+# The scan EnumIndex replaced: the first enum in file order whose name holds
+# the argument type or one of whose values is in the assignment or usage
+#
+def first_match(enums, arg_type, assignment, usage):
+    for enum_name, enum_def in enums.items():
+        if arg_type.lower() in enum_name.lower():
+            return enum_name
+        if any(value.lower() in assignment.lower() or value in usage.lower() for value in enum_def.values):
+            return enum_name
+    return None
+
+ENUMS = {
+    'EFI_ALLOCATE_TYPE': EnumDef('EFI_ALLOCATE_TYPE', ['AllocateAnyPages', 'AllocateMaxAddress', 'AllocateAddress'], 'UefiSpec.h'),
+    'EFI_MEMORY_TYPE': EnumDef('EFI_MEMORY_TYPE', ['EfiReservedMemoryType', 'EfiLoaderCode', 'EfiBootServicesData'], 'UefiMultiPhase.h'),
+    'EFI_TIMER_DELAY': EnumDef('EFI_TIMER_DELAY', ['TimerCancel', 'TimerPeriodic', 'TimerRelative'], 'UefiSpec.h'),
+    'lower_case_enum': EnumDef('lower_case_enum', ['first_value', 'second'], 'Lower.h'),
+}
+
+def find(enums, arg_type, assignment, usage):
+    match = EnumIndex(enums).find(arg_type, assignment, usage)
+    return None if match is None else match[0]
+
+def test_matches_by_name_and_value():
+    assert find(ENUMS, 'EFI_MEMORY_TYPE', '', '') == 'EFI_MEMORY_TYPE'
+    assert find(ENUMS, 'UINTN', 'EfiLoaderCode', '') == 'EFI_MEMORY_TYPE'
+    # the assignment is matched case-folded
+    assert find(ENUMS, 'UINTN', 'timerperiodic', '') == 'EFI_TIMER_DELAY'
+    # the usage is lower-cased, so only all lower case values can match it
+    assert find(ENUMS, 'UINTN', '', 'TimerPeriodic') is None
+    assert find(ENUMS, 'UINTN', '', 'x == second') == 'lower_case_enum'
+    assert find(ENUMS, 'UINTN', 'NotAnEnumValue', 'nothing') is None
+
+def test_first_enum_in_file_order_wins():
+    # TimerCancel belongs to a later enum than the one named by the type
+    assert find(ENUMS, 'ALLOCATE', 'TimerCancel', '') == 'EFI_ALLOCATE_TYPE'
+    assert find(ENUMS, 'DELAY', 'AllocateAddress', '') == 'EFI_ALLOCATE_TYPE'
+    # an empty type is part of every enum name
+    assert find(ENUMS, '', 'TimerCancel', '') == 'EFI_ALLOCATE_TYPE'
+
+def test_same_as_first_match_on_random_enums():
+    generator = random.Random(1)
+    alphabet = 'abAB_'
+    word = lambda length: ''.join(generator.choice(alphabet) for _ in range(length))
+    for _ in range(50):
+        enums = {}
+        for _ in range(generator.randint(1, 6)):
+            name = word(generator.randint(1, 5))
+            enums[name] = EnumDef(name, [word(generator.randint(0, 4)) for _ in range(generator.randint(0, 4))], 'Enum.h')
+        index = EnumIndex(enums)
+        for _ in range(40):
+            arg_type, assignment, usage = word(generator.randint(0, 3)), word(generator.randint(0, 8)), word(generator.randint(0, 8))
+            match = index.find(arg_type, assignment, usage)
+            assert (None if match is None else match[0]) == first_match(enums, arg_type, assignment, usage)
+
+def test_index_follows_the_enum_map():
+    enums = IndexedDict(ENUMS)
+    assert enum_index(enums) is enum_index(enums)
+    assert enum_index(enums).find('UINTN', 'NewValue', '') is None
+    enums['NEW_ENUM'] = EnumDef('NEW_ENUM', ['NewValue'], 'New.h')
+    assert enum_index(enums).find('UINTN', 'NewValue', '')[0] == 'NEW_ENUM'
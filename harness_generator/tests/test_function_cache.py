@@ -0,0 +1,67 @@
+import copy
+import pytest
+from common import snapshot_cache
+from common.function_cache import FunctionCache
+from test_collect_arguments import CALL_SITES, TABLES, collect
+
+#
+# Analyze the inline call database through the function cache in tmp_path,
+# as a run of its own, and return the result with the cache summary
+#
+def cached_run(tmp_path, capsys, **options):
+    function_cache = FunctionCache(str(tmp_path / 'analysis-cache.sqlite'))
+    capsys.readouterr()
+    result = collect(tmp_path, function_cache=function_cache, **options)
+    function_cache.close()
+    summary = [line for line in capsys.readouterr().out.splitlines() if 'Function analysis cache' in line]
+    return result, summary
+
+def test_unchanged_functions_are_reused(tmp_path, capsys):
+    uncached = collect(tmp_path)
+    first, summary = cached_run(tmp_path, capsys)
+    assert summary == ['INFO: Function analysis cache: 0 functions reused, 4 analyzed']
+    second, summary = cached_run(tmp_path, capsys)
+    assert summary == ['INFO: Function analysis cache: 4 functions reused, 0 analyzed']
+    assert first == second == uncached
+
+def test_parallel_runs_fill_the_same_cache(tmp_path, capsys):
+    first, _ = cached_run(tmp_path, capsys, jobs=2)
+    second, summary = cached_run(tmp_path, capsys)
+    assert summary == ['INFO: Function analysis cache: 4 functions reused, 0 analyzed']
+    assert first == second
+
+def test_changed_call_site_misses(tmp_path, capsys):
+    cached_run(tmp_path, capsys)
+    call_sites = copy.deepcopy(CALL_SITES)
+    call_sites[2]['Arguments']['Arg_0']['usage'] = 'L"BootOrder"'
+    changed, summary = cached_run(tmp_path, capsys, call_sites=call_sites)
+    # only SetVariable is analyzed again
+    assert summary == ['INFO: Function analysis cache: 3 functions reused, 1 analyzed']
+    assert changed == collect(tmp_path, call_sites=call_sites)
+
+def test_changed_alias_misses(tmp_path, capsys):
+    cached_run(tmp_path, capsys)
+    # reached from the EFI_PHYSICAL_ADDRESS * argument of AllocatePages only
+    aliases = dict(TABLES['aliases.json'], EFI_PHYSICAL_ADDRESS='UINT32')
+    changed, summary = cached_run(tmp_path, capsys, tables={'aliases.json': aliases})
+    assert summary == ['INFO: Function analysis cache: 3 functions reused, 1 analyzed']
+    assert changed == collect(tmp_path, tables={'aliases.json': aliases})
+    # a new alias name can change how any cast is stripped
+    aliases['EFI_LBA'] = 'UINT64'
+    _, summary = cached_run(tmp_path, capsys, tables={'aliases.json': aliases})
+    assert summary == ['INFO: Function analysis cache: 0 functions reused, 4 analyzed']
+
+def test_changed_analysis_source_misses(tmp_path, capsys, monkeypatch):
+    cached_run(tmp_path, capsys)
+    monkeypatch.setattr(snapshot_cache, '_source_digest', 'edited analyze.py')
+    _, summary = cached_run(tmp_path, capsys)
+    assert summary == ['INFO: Function analysis cache: 0 functions reused, 4 analyzed']
+
+@pytest.mark.parametrize('flag', ['random', 'best_guess'])
+def test_run_flags_miss(tmp_path, capsys, flag):
+    cached_run(tmp_path, capsys)
+    changed, summary = cached_run(tmp_path, capsys, **{flag: True})
+    assert summary == ['INFO: Function analysis cache: 0 functions reused, 4 analyzed']
+    assert changed == collect(tmp_path, **{flag: True})
+    _, summary = cached_run(tmp_path, capsys, **{flag: True})
+    assert summary == ['INFO: Function analysis cache: 4 functions reused, 0 analyzed']
@@ -0,0 +1,148 @@
+import os
+import random
+from common.generate_library_map import PRUNED_DIRECTORIES, InfCache, add_library_classes, generate_libmap, parse_edk2, parse_inf, parse_library_classes
+
+def write(root, path, text):
+    file_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file:
+        file.write(text)
+
+def library_inf(library_class, dependencies=(), module_types=None):
+    line = library_class if module_types is None else f'{library_class}|{module_types}'
+    return '[Defines]\n  LIBRARY_CLASS = {}\n\n[LibraryClasses]\n{}\n'.format(line, ''.join(f'  {dep}\n' for dep in dependencies))
+
+def platform_dsc(library_classes):
+    return '[LibraryClasses]\n{}\n[Components]\n'.format(''.join(f'  {name}|{path}\n' for name, path in library_classes))
+
+#
+# The serial crawl parse_edk2 replaced, os.walk with the pruned directories
+# left out and every library class taken from its first usable definition
+#
+def serial_libmap(root):
+    lib_map = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name not in PRUNED_DIRECTORIES]
+        for name in filenames:
+            if name.endswith('.dsc') or name.endswith('.inc'):
+                add_library_classes(parse_library_classes(os.path.join(dirpath, name)), root, lib_map)
+    return lib_map
+
+#
+# The two reads of an .inf parse_inf replaced
+#
+def two_read_parse(inf_path):
+    usable = False
+    if os.path.isfile(inf_path):
+        with open(inf_path, 'r') as file:
+            usable = any('LIBRARY_CLASS' in line and ('|' not in line or 'UEFI_APPLICATION' in line) for line in file)
+    if not usable:
+        return False, []
+    libclasses = set()
+    with open(inf_path, 'r') as file:
+        inside_library_classes = False
+        for line in file:
+            if 'LibraryClasses' in line:
+                inside_library_classes = True
+                continue
+            if inside_library_classes and (line.startswith('[') or line.startswith('<')):
+                break
+            if inside_library_classes and line.strip() and not line.strip().startswith('#'):
+                libclasses.add(line.strip())
+    return True, list(libclasses)
+
+def normalized(lib_map):
+    return [(name, entry['path'], sorted(entry['dependencies'])) for name, entry in lib_map.items()]
+
+def test_first_usable_definition_wins(tmp_path):
+    root = str(tmp_path)
+    write(root, 'MdePkg/Library/PeimBaseLib/PeimBaseLib.inf', library_inf('BaseLib', module_types='PEIM'))
+    write(root, 'MdePkg/Library/BaseLib/BaseLib.inf', library_inf('BaseLib', ['DebugLib']))
+    write(root, 'MdePkg/Library/DebugLib/DebugLib.inf', library_inf('DebugLib', module_types='UEFI_APPLICATION DXE_DRIVER'))
+    write(root, 'MdePkg/Library/OtherDebugLib/OtherDebugLib.inf', library_inf('DebugLib'))
+    write(root, 'MdePkg/MdePkg.dsc', platform_dsc([
+        # not usable from an application, the next definition is taken
+        ('BaseLib', 'MdePkg/Library/PeimBaseLib/PeimBaseLib.inf'),
+        ('DebugLib', 'MdePkg/Library/DebugLib/DebugLib.inf'),
+        ('BaseLib', 'MdePkg/Library/BaseLib/BaseLib.inf'),
+        ('DebugLib', 'MdePkg/Library/OtherDebugLib/OtherDebugLib.inf'),
+        # missing .inf
+        ('PrintLib', 'MdePkg/Library/PrintLib/PrintLib.inf'),
+    ]))
+    # build output is never crawled
+    write(root, 'Build/Platform.dsc', platform_dsc([('PrintLib', 'MdePkg/Library/BaseLib/BaseLib.inf')]))
+
+    lib_map = parse_edk2(root, jobs=4)
+    # in the order the serial crawl would have added the classes
+    assert list(lib_map.keys()) == ['DebugLib', 'BaseLib']
+    assert lib_map['DebugLib'] == {'path': 'MdePkg/Library/DebugLib/DebugLib.inf', 'dependencies': []}
+    assert lib_map['BaseLib'] == {'path': 'MdePkg/Library/BaseLib/BaseLib.inf', 'dependencies': ['DebugLib']}
+
+def random_tree(root, generator):
+    classes = [f'Class{index}Lib' for index in range(8)]
+    inf_files = []
+    for index in range(20):
+        inf_path = f'Pkg{index % 3}/Library/Lib{index}/Lib{index}.inf'
+        inf_files.append(inf_path)
+        module_types = generator.choice([None, 'UEFI_APPLICATION', 'PEIM', 'DXE_DRIVER UEFI_APPLICATION'])
+        write(root, inf_path, library_inf(generator.choice(classes), generator.sample(classes, 2), module_types))
+    # some of the listed .inf files don't exist
+    inf_files += ['Pkg0/Library/Missing/Missing.inf']
+    directories = ['', 'Pkg0', 'Pkg1', 'Pkg1/Nested', 'Pkg2/Deeper/Still', 'Build', 'Pkg2/Conf']
+    for index in range(12):
+        listed = [(generator.choice(classes), generator.choice(inf_files)) for _ in range(generator.randint(1, 6))]
+        extension = generator.choice(['dsc', 'inc'])
+        write(root, os.path.join(generator.choice(directories), f'Platform{index}.{extension}'), platform_dsc(listed))
+
+def test_same_as_serial_crawl(tmp_path):
+    generator = random.Random(1)
+    for attempt in range(10):
+        root = str(tmp_path / str(attempt))
+        random_tree(root, generator)
+        assert normalized(parse_edk2(root, jobs=4)) == normalized(serial_libmap(root))
+
+def test_manifest_reuse_gives_the_same_map(tmp_path, capsys):
+    root = str(tmp_path / 'edk2')
+    random_tree(root, random.Random(2))
+    output_file = str(tmp_path / 'libmap.json')
+    built = generate_libmap(root, output_file)
+    capsys.readouterr()
+    reused = generate_libmap(root, output_file)
+    assert normalized(reused) == normalized(built)
+    # nothing was parsed again
+    summary = capsys.readouterr().out
+    assert 'Library map: 0 of ' in summary and ', 0 misses' in summary
+    write(root, 'Pkg1/Platform.dsc', platform_dsc([('NewLib', 'Pkg0/Library/Lib0/Lib0.inf')]))
+    rebuilt = generate_libmap(root, output_file)
+    assert normalized(rebuilt) == normalized(generate_libmap(root, output_file, reuse=False))
+
+def test_parse_inf_same_as_two_reads(tmp_path):
+    generator = random.Random(3)
+    lines = ['[Defines]', '  LIBRARY_CLASS = BaseLib', '  LIBRARY_CLASS = BaseLib|PEIM', '  LIBRARY_CLASS = BaseLib|DXE_DRIVER UEFI_APPLICATION',
+             '[LibraryClasses]', '[LibraryClasses.X64]', '  DebugLib', '  # PrintLib', '', '  PcdLib', '[Sources]', '<Extra>', '  BaseLib.c']
+    for index in range(300):
+        inf_path = str(tmp_path / f'Lib{index}.inf')
+        write(str(tmp_path), f'Lib{index}.inf', '\n'.join(generator.choice(lines) for _ in range(generator.randint(0, 12))))
+        usable, libclasses = parse_inf(inf_path)
+        expected_usable, expected_libclasses = two_read_parse(inf_path)
+        assert (usable, sorted(libclasses)) == (expected_usable, sorted(expected_libclasses))
+    assert parse_inf(str(tmp_path / 'Missing.inf')) == (False, [])
+
+def test_inf_cache_reads_each_file_once(tmp_path):
+    root = str(tmp_path)
+    write(root, 'Pkg/BaseLib.inf', library_inf('BaseLib', ['DebugLib']))
+    write(root, 'Pkg/PeimLib.inf', library_inf('PeimLib', module_types='PEIM'))
+    inf_cache = InfCache(root)
+    for _ in range(3):
+        assert inf_cache.library(os.path.join(root, 'Pkg/BaseLib.inf')) == (True, ['DebugLib'])
+        assert inf_cache.library(os.path.join(root, 'Pkg/PeimLib.inf')) == (False, [])
+    assert (inf_cache.misses, inf_cache.hits) == (2, 4)
+
+    # a later run reuses what is unchanged and parses the rest again
+    write(root, 'Pkg/PeimLib.inf', library_inf('PeimLib', ['BaseLib']))
+    os.utime(os.path.join(root, 'Pkg/PeimLib.inf'), ns=(1, 1))
+    next_run = InfCache(root, inf_cache.entries)
+    assert next_run.library(os.path.join(root, 'Pkg/BaseLib.inf')) == (True, ['DebugLib'])
+    assert next_run.library(os.path.join(root, 'Pkg/PeimLib.inf')) == (True, ['BaseLib'])
+    assert (next_run.misses, next_run.hits) == (1, 1)
+    assert not next_run.unchanged()
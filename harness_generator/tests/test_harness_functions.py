@@ -0,0 +1,86 @@
+import pickle
+from data_analysis.analyze import load_functions, select_call_groups
+
+INPUT_TXT = '''\
+[OtherFunctions]
+    Helper
+
+[BootServices]
+    AllocatePool
+    FreePool
+    ReadKeyStroke
+
+[Protocols]
+// the first guid listed for a function in a group is the one used
+    GUID-1:ReadKeyStroke
+    GUID-2:ReadKeyStroke
+
+[RuntimeServices]
+'''
+
+def harness_functions(tmp_path):
+    input_file = tmp_path / 'input.txt'
+    input_file.write_text(INPUT_TXT)
+    return load_functions(str(input_file))
+
+def test_load_functions_keeps_the_group_lists(tmp_path):
+    functions = harness_functions(tmp_path)
+    assert list(functions.keys()) == ['OtherFunctions', 'BootServices', 'Protocols']
+    assert functions['BootServices'] == [('AllocatePool', ''), ('FreePool', ''), ('ReadKeyStroke', '')]
+    assert functions['Protocols'] == [('ReadKeyStroke', 'GUID-1'), ('ReadKeyStroke', 'GUID-2')]
+
+def test_lookups_by_name(tmp_path):
+    functions = harness_functions(tmp_path)
+    assert list(functions.names()) == ['Helper', 'AllocatePool', 'FreePool', 'ReadKeyStroke']
+    assert functions.groups('ReadKeyStroke') == [('BootServices', ''), ('Protocols', 'GUID-1')]
+    assert functions.first_group('ReadKeyStroke') == 'BootServices'
+    assert functions.first_group('Missing') is None
+    assert functions.in_group('Helper', 'OtherFunctions')
+    assert not functions.in_group('Helper', 'BootServices')
+    # Names are matched exactly, not as a part of a longer listed name
+    assert not functions.is_harnessed('Read')
+
+def test_service_groups(tmp_path):
+    functions = harness_functions(tmp_path)
+    assert functions.service_groups('gBS') == ['BootServices']
+    assert functions.service_groups('gRT') == ['RuntimeServices']
+    assert functions.service_groups('protocol') == ['Protocols']
+    assert functions.service_groups('unknown') == []
+
+def test_pickle_keeps_the_index(tmp_path):
+    functions = harness_functions(tmp_path)
+    copy = pickle.loads(pickle.dumps(functions))
+    assert copy == functions
+    assert copy.groups('ReadKeyStroke') == functions.groups('ReadKeyStroke')
+    copy.add('OtherFunctions', 'Extra', '')
+    assert copy.is_harnessed('Extra')
+    assert not functions.is_harnessed('Extra')
+
+#
+# {function: {param count: (call sites, services)}} the way the call site
+# table and store report them
+#
+GROUP_STATS = {
+    # kept through the BootServices call, the lone call through another service is not
+    'AllocatePool': {2: (5, ['BS']), 3: (1, ['other'])},
+    # listed under OtherFunctions, kept whatever the service
+    'Helper': {1: (2, ['unknown'])},
+    # not listed, only ReadKeyStroke is
+    'Read': {2: (3, ['protocol'])},
+    # no parameter count makes up half of the calls
+    'FreePool': {1: (1, ['BS']), 2: (1, ['BS']), 3: (1, ['BS']), 4: (1, ['BS']), 5: (1, ['BS'])},
+    # only called through a service it isn't listed under
+    'ReadKeyStroke': {2: (4, ['DS']), 3: (1, ['DS'])},
+}
+
+def test_select_call_groups(tmp_path, capsys):
+    functions = harness_functions(tmp_path)
+    assert select_call_groups(GROUP_STATS, functions, False) == [('AllocatePool', 2), ('Helper', 1)]
+    log = capsys.readouterr().out
+    assert 'WARNING: Read is not in the harness functions list!!' in log
+    assert 'WARNING: FreePool has too many different parameter counts to be harnessed!!' in log
+
+def test_select_call_groups_best_guess(tmp_path):
+    functions = harness_functions(tmp_path)
+    # The first group of every listed function that had none selected is added at the end
+    assert select_call_groups(GROUP_STATS, functions, True) == [('AllocatePool', 2), ('Helper', 1), ('ReadKeyStroke', 2)]
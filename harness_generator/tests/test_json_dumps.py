@@ -0,0 +1,21 @@
+import json
+import pytest
+from common.utils import write_json_records, write_json_items
+
+RECORDS = [{"Function": "ReadKeyStroke", "Arguments": {"Arg_0": {"arg_type": "EFI_KEY_DATA *", "usage": "a\nb"}}}, [], "x"]
+
+@pytest.mark.parametrize('records', [[], RECORDS])
+def test_records_in_both_layouts(tmp_path, records):
+    indented, compact = tmp_path / 'data.json', tmp_path / 'data.jsonl'
+    write_json_records(iter(records), str(indented))
+    write_json_records(iter(records), str(compact), compact=True)
+    assert json.loads(indented.read_text()) == records
+    assert [json.loads(line) for line in compact.read_text().splitlines()] == records
+
+@pytest.mark.parametrize('items', [[], [("ReadKeyStroke", RECORDS[0]), ("Empty", {})]])
+def test_items_in_both_layouts(tmp_path, items):
+    indented, compact = tmp_path / 'data.json', tmp_path / 'data.jsonl'
+    write_json_items(iter(items), str(indented))
+    write_json_items(iter(items), str(compact), compact=True)
+    assert json.loads(indented.read_text()) == dict(items)
+    assert [json.loads(line) for line in compact.read_text().splitlines()] == [{key: value} for key, value in items]
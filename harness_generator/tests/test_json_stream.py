@@ -0,0 +1,51 @@
+import gzip
+import io
+import json
+import pytest
+from common.utils import iter_json_array, iter_json_spans
+
+DOCUMENTS = [
+    '[]',
+    ' \n [ \n ] \n',
+    '[1]',
+    '[1,2,3]',
+    '[12345, -6.5e-3, true, false, null, "x"]',
+    '[{"Function": "ReadKeyStroke", "Arguments": {"Arg_0": {"arg_type": "EFI_KEY_DATA *"}}}]',
+    # separators and brackets inside strings
+    '[ "a,b]", "[c", {"k": "}, ]"}, "\\"]\\"" ]',
+    '[\n    {"usage": "éè ☃"},\n    [[], [1, [2, [3]]]],\n    {}\n]',
+]
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 1 << 16])
+def test_same_elements_as_json_load(tmp_path, document, chunk_size):
+    json_file = tmp_path / 'data.json'
+    json_file.write_text(document, encoding='utf-8')
+    assert list(iter_json_array(str(json_file), chunk_size)) == json.loads(document)
+
+def test_top_level_null_is_empty(tmp_path):
+    json_file = tmp_path / 'data.json'
+    json_file.write_text('null\n')
+    assert list(iter_json_array(str(json_file))) == []
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 5, 1 << 16])
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_spans_cover_each_element(chunk_size, newline):
+    document = f'[ {{"a": [1, 2]}} ,"b",{newline} 300 ,{newline}null]'
+    spans = list(iter_json_spans(io.StringIO(document, newline=''), 'data.json', chunk_size))
+    assert [element for element, _, _ in spans] == json.loads(document)
+    assert [document[start:end] for _, start, end in spans] == ['{"a": [1, 2]}', '"b"', '300', 'null']
+
+def test_compressed_input(tmp_path):
+    call_sites = [{"Function": f"Function{index}", "Arguments": {}} for index in range(100)]
+    json_file = tmp_path / 'call-database.json.gz'
+    with gzip.open(json_file, 'wt') as file:
+        json.dump(call_sites, file)
+    assert list(iter_json_array(str(json_file), 64)) == call_sites
+
+@pytest.mark.parametrize('document', ['{"a": 1}', '[1, 2', '[1, {"a": 2}', '[1, "a]', '[1x]', '[-6.5e]'])
+def test_malformed_input(tmp_path, document):
+    json_file = tmp_path / 'data.json'
+    json_file.write_text(document)
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(json_file), 3))
@@ -0,0 +1,50 @@
+import random
+from difflib import SequenceMatcher
+import pytest
+from common import similarity
+from common.similarity import NameSimilarity
+
+pytestmark = pytest.mark.skipif(similarity.Levenshtein is not None,
+                                reason='scores come from python-Levenshtein, not the stdlib reference')
+
+#
+# fuzz.ratio as fuzzywuzzy computes it without python-Levenshtein
+#
+def reference_ratio(first, second):
+    if first is None or second is None:
+        return 0
+    if first == second:
+        return 100
+    if len(first) == 0 or len(second) == 0:
+        return 0
+    return int(round(100 * SequenceMatcher(None, first, second).ratio()))
+
+def test_edge_cases():
+    names = NameSimilarity()
+    assert names.ratio(None, 'AllocatePool') == 0
+    assert names.ratio('', '') == 100
+    assert names.ratio('', 'AllocatePool') == 0
+    assert names.ratio('AllocatePool', 'AllocatePool') == 100
+    assert names.similar('AllocatePool', 'AllocatePool', 65)
+    assert not names.similar('', 'AllocatePool', 65)
+
+def test_generator_names():
+    names = NameSimilarity()
+    pairs = [('AllocatePool', 'AllocatePages'), ('AllocatePool', 'FreePool'), ('LocateProtocol', 'LocateHandleBuffer'),
+             ('GetVariable', 'SetVariable'), ('ReadKeyStroke', 'ReadKeyStrokeEx'), ('CreateEvent', 'SignalEvent')]
+    for first, second in pairs:
+        assert names.ratio(first, second) == reference_ratio(first, second)
+        for threshold in (0, 50, 65, 90, 100):
+            assert names.similar(first, second, threshold) == (reference_ratio(first, second) > threshold)
+
+def test_same_as_reference_on_random_names():
+    generator = random.Random(1)
+    names = NameSimilarity()
+    word = lambda: ''.join(generator.choice('abcAB') for _ in range(generator.randint(0, 12)))
+    for _ in range(3000):
+        first, second = word(), word()
+        threshold = generator.choice((30, 50, 65, 80))
+        # asked twice so the memoized answers are checked as well
+        for _ in range(2):
+            assert names.similar(first, second, threshold) == (reference_ratio(first, second) > threshold)
+            assert names.ratio(first, second) == reference_ratio(first, second)
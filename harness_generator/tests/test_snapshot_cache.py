@@ -0,0 +1,51 @@
+import os
+from common import snapshot_cache
+from common.snapshot_cache import SnapshotCache
+
+def build_counter():
+    calls = []
+    def builder():
+        calls.append(1)
+        return {'built': len(calls)}
+    return calls, builder
+
+def test_reuses_snapshots_of_unchanged_inputs(tmp_path):
+    input_file = tmp_path / 'macros.json'
+    input_file.write_text('[]')
+    calls, builder = build_counter()
+    cache = SnapshotCache(str(tmp_path / 'cache'))
+    assert cache.load('macros', [str(input_file)], builder) == {'built': 1}
+    # a new cache object is a new run
+    cache = SnapshotCache(str(tmp_path / 'cache'))
+    assert cache.load('macros', [str(input_file)], builder) == {'built': 1}
+    assert (cache.hits, cache.misses, len(calls)) == (1, 0, 1)
+    # other parameters make another snapshot
+    assert cache.load('macros', [str(input_file)], builder, (True,)) == {'built': 2}
+
+def test_changed_input_misses(tmp_path):
+    input_file = tmp_path / 'macros.json'
+    input_file.write_text('[]')
+    calls, builder = build_counter()
+    SnapshotCache(str(tmp_path / 'cache')).load('macros', [str(input_file)], builder)
+    input_file.write_text('[1]')
+    os.utime(input_file, ns=(1, 1))
+    assert SnapshotCache(str(tmp_path / 'cache')).load('macros', [str(input_file)], builder) == {'built': 2}
+
+def test_changed_builder_source_misses(tmp_path, monkeypatch):
+    input_file = tmp_path / 'macros.json'
+    input_file.write_text('[]')
+    calls, builder = build_counter()
+    SnapshotCache(str(tmp_path / 'cache')).load('macros', [str(input_file)], builder)
+    monkeypatch.setattr(snapshot_cache, '_source_digest', 'edited loaders.py')
+    assert SnapshotCache(str(tmp_path / 'cache')).load('macros', [str(input_file)], builder) == {'built': 2}
+
+def test_source_digest_follows_the_builder_modules(tmp_path, monkeypatch):
+    for package in snapshot_cache.SOURCE_PACKAGES:
+        (tmp_path / package).mkdir()
+    (tmp_path / 'data_analysis' / 'loaders.py').write_text('def load_macros(): pass\n')
+    monkeypatch.setattr(snapshot_cache, '__file__', str(tmp_path / 'common' / 'snapshot_cache.py'))
+    monkeypatch.setattr(snapshot_cache, '_source_digest', None)
+    before = snapshot_cache.source_digest()
+    (tmp_path / 'data_analysis' / 'loaders.py').write_text('def load_macros(): return {}\n')
+    monkeypatch.setattr(snapshot_cache, '_source_digest', None)
+    assert snapshot_cache.source_digest() != before
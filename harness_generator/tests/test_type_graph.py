@@ -0,0 +1,42 @@
+from common.indexed import IndexedDict
+from common.type_graph import type_graph
+from common.types import FieldInfo, TypeInfo
+import uefi_harness.smi_harness_template as smi_harnesses
+
+TYPES = IndexedDict({
+    'EFI_INPUT_KEY': TypeInfo('EFI_INPUT_KEY', [FieldInfo('ScanCode', 'UINT16'), FieldInfo('UnicodeChar', 'CHAR16')]),
+    'EFI_KEY_DATA': TypeInfo('EFI_KEY_DATA', [FieldInfo('Key', 'EFI_INPUT_KEY'), FieldInfo('KeyState', 'EFI_KEY_STATE')]),
+    'EFI_KEY_STATE': TypeInfo('EFI_KEY_STATE', [FieldInfo('KeyShiftState', 'UINT32'), FieldInfo('KeyToggleState', 'EFI_KEY_TOGGLE_STATE')]),
+    'LIST_ENTRY': TypeInfo('LIST_ENTRY', [FieldInfo('ForwardLink', 'LIST_ENTRY *'), FieldInfo('BackLink', 'LIST_ENTRY *')]),
+    'EMPTY': TypeInfo('EMPTY', []),
+})
+ALIASES = IndexedDict({'EFI_KEY_TOGGLE_STATE': 'UINT8', 'KEY_DATA': 'EFI_KEY_DATA', 'EMPTY': 'EFI_INPUT_KEY'})
+
+def test_depth():
+    graph = type_graph(ALIASES, TYPES)
+    assert graph.depth('UINT16') == 0
+    assert graph.depth('EFI_INPUT_KEY') == 1
+    assert graph.depth('EFI_KEY_DATA') == 2
+    assert graph.depth('KEY_DATA') == 2
+    assert graph.depth('LIST_ENTRY') is None
+
+def test_struct_fields_through_aliases():
+    graph = type_graph(ALIASES, TYPES)
+    names = lambda type: [field.name for field in graph.struct_fields(type)]
+    assert names('EFI_KEY_DATA *') == ['Key', 'KeyState']
+    assert names('KEY_DATA *') == ['Key', 'KeyState']
+    # a struct without fields is read as the type it aliases
+    assert names('EMPTY') == ['ScanCode', 'UnicodeChar']
+    assert len(graph.struct_fields('LIST_ENTRY')) == 2
+
+def test_generator_struct_args(monkeypatch):
+    monkeypatch.setattr(smi_harnesses, 'aliases_map', IndexedDict(ALIASES))
+    assert smi_harnesses.generator_struct_args('KEY_DATA *', 'KeyData', {}, TYPES, False) == [
+        '// Generator Struct Variable Initialization',
+        'ReadBytes(Input, sizeof(KeyData->Key), (VOID *)&(KeyData->Key));',
+        'ReadBytes(Input, sizeof(KeyData->KeyState), (VOID *)&(KeyData->KeyState));',
+    ]
+    assert smi_harnesses.generator_struct_args('LIST_ENTRY *', 'Entry', {}, TYPES, False)[1:] == [
+        'ReadBytes(Input, sizeof(Entry->ForwardLink), (VOID *)(Entry->ForwardLink));',
+        'ReadBytes(Input, sizeof(Entry->BackLink), (VOID *)(Entry->BackLink));',
+    ]
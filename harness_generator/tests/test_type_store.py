@@ -0,0 +1,25 @@
+import json
+import pytest
+from data_analysis.loaders import load_types
+
+TYPES = [
+    {"TypeName": "EFI_KEY_DATA", "File": "MdePkg/Include/Protocol/SimpleTextInEx.h",
+     "Fields": [{"Name": "Key", "Type": "EFI_INPUT_KEY"}, {"Name": "KeyState", "Type": "EFI_KEY_STATE"}]},
+    {"TypeName": "EFI_INPUT_KEY", "File": "MdePkg/Include/Protocol/SimpleTextIn.h",
+     "Fields": [{"Name": "ScanCode", "Type": "UINT16"}, {"Name": "UnicodeChar", "Type": "CHAR16"}]},
+    {"TypeName": "EMPTY", "File": "a.h", "Fields": []},
+]
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_lookups_match_the_file(tmp_path, newline):
+    types_file = tmp_path / 'types.json'
+    types_file.write_bytes(json.dumps(TYPES, indent=4).replace('\n', newline).encode())
+    # the second load reuses the saved index
+    for _ in range(2):
+        types = load_types(str(types_file))
+        for type_data_dict in reversed(TYPES):
+            type_info = types[type_data_dict['TypeName']]
+            assert type_info.name == type_data_dict['TypeName']
+            assert [(field.name, field.type) for field in type_info.fields] == \
+                [(field['Name'], field['Type']) for field in type_data_dict['Fields']]
+        assert sorted(types) == sorted(type_data_dict['TypeName'] for type_data_dict in TYPES)
@@ -2,8 +2,11 @@ from typing import List, Dict
 import copy
 from common.types import FunctionBlock, Argument, TypeTracker, FieldInfo, TypeInfo, EnumDef
 from common.utils import add_indents, remove_ref_symbols
+from common.type_graph import type_graph
+from common.indexed import IndexedDict
 
-aliases_map = {}
+# Kept as an IndexedDict so the type graph built over it is reused
+aliases_map = IndexedDict()
 enum_map = {}
 
 # this is a function that will return the underlying data type for any function
@@ -395,8 +398,7 @@ def generator_struct_args(function: str,
     #     output.append('}')
     # else:
     if arg.variable.startswith('__FUZZABLE_') and arg.variable.endswith('_STRUCT__'):
-        struct_type = remove_ref_symbols(arg.arg_type) if len(types.get(remove_ref_symbols(arg.arg_type), TypeInfo()).fields) > 0 else (aliases_map.get(remove_ref_symbols(arg.arg_type), None))
-        for field in types[struct_type].fields:
+        for field in type_graph(aliases_map, types).struct_fields(arg.arg_type):
             if not has_pointer(field.type):
                 output.append(f'ReadBytes(Input, sizeof({function}_{arg_key}->{field.name}), (VOID *)&({function}_{arg_key}->{field.name}));')
             else: